@@ -0,0 +1,232 @@
+# encoding: utf-8
+
+"""
+LOUDNESS ANALYSIS OF PYGAME SOUNDS
+
+LoudnessAnalyzer measures the peak, the RMS and an integrated loudness estimate (ITU-R BS.1770
+K-weighting and gating, LUFS) of pygame.mixer.Sound objects with vectorized numpy code over the
+samples returned by pygame.sndarray.array.
+Results are cached in a sidecar JSON file keyed by the hash of the sound content (and the mixer
+format), the analysis runs once per asset, not at every startup.
+
+e.g
+    ANALYZER = LoudnessAnalyzer("loudness.json")
+    ANALYZER.analyze_all([sound1, sound2])
+    SND.set_analyzer(ANALYZER)
+    SND.play(sound1, 0, normalize_=-23.0)    # play sound1 at -23 LUFS
+    SND.get_audible_levels()                  # estimated level of each voice (LUFS)
+"""
+
+try:
+    import pygame
+    from pygame import mixer
+except ImportError:
+    raise ImportError("\n<pygame> library is missing on your system."
+          "\nTry: \n   C:\\pip install pygame on a window command prompt.")
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("\n<numpy> library is missing on your system."
+          "\nTry: \n   C:\\pip install numpy on a window command prompt.")
+
+import os
+import json
+import hashlib
+import weakref
+from collections import namedtuple
+
+from SoundRender import sound_to_array
+
+
+# LOUDNESS OF A SILENT SOUND (ABSOLUTE GATE)
+SILENCE = -70.0
+
+# peak and rms are linear values in range [0.0 ... 1.0], loudness is expressed in LUFS
+Loudness = namedtuple("Loudness", ("peak", "rms", "loudness"))
+
+
+def _biquad_response(b_, a_, w_):
+    """
+    RETURN THE COMPLEX FREQUENCY RESPONSE OF A BIQUAD FILTER
+
+    :param b_: tuple; numerator coefficients (b0, b1, b2)
+    :param a_: tuple; denominator coefficients (a0, a1, a2)
+    :param w_: numpy.ndarray; normalised angular frequencies (radians / sample)
+    :return  : numpy.ndarray; complex response
+    """
+    z1 = numpy.exp(-1j * w_)
+    z2 = z1 * z1
+    return (b_[0] + b_[1] * z1 + b_[2] * z2) / (a_[0] + a_[1] * z1 + a_[2] * z2)
+
+
+def k_weighting(frequency_: int, w_):
+    """
+    RETURN THE COMPLEX RESPONSE OF THE BS.1770 K-WEIGHTING FILTER (HIGH SHELF + HIGH PASS)
+    FOR A GIVEN SAMPLE RATE. THE COEFFICIENTS ARE DERIVED FROM THE ANALOG PROTOTYPE (SAME VALUES
+    THAN THE BS.1770 TABLES AT 48 KHZ)
+
+    :param frequency_: integer; sample rate
+    :param w_        : numpy.ndarray; normalised angular frequencies (radians / sample)
+    :return          : numpy.ndarray; complex response
+    """
+    # STAGE 1, HIGH SHELF (+4 dB above ~1.7 kHz)
+    k = numpy.tan(numpy.pi * 1681.974450955533 / frequency_)
+    q = 0.7071752369554196
+    vh = 10.0 ** (3.999843853973347 / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = _biquad_response(
+        ((vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0),
+        (1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0), w_)
+
+    # STAGE 2, HIGH PASS (~38 Hz)
+    k = numpy.tan(numpy.pi * 38.13547087602444 / frequency_)
+    q = 0.5003270373238773
+    a0 = 1.0 + k / q + k * k
+    highpass = _biquad_response(
+        (1.0, -2.0, 1.0), (1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0), w_)
+
+    return shelf * highpass
+
+
+def measure(data_, frequency_: int):
+    """
+    MEASURE THE PEAK, RMS AND INTEGRATED LOUDNESS OF A SAMPLE ARRAY
+
+    The K-weighting filter is applied in the frequency domain (FFT of the whole sound), the gated
+    loudness uses 400 ms blocks with 75% overlap, an absolute gate at -70 LUFS and a relative gate
+    at -10 LU (sounds shorter than 400 ms are measured as a single block).
+
+    :param data_     : numpy.ndarray; float32 samples in range [-1.0 ... 1.0] (frames x channels)
+    :param frequency_: integer; sample rate
+    :return          : Loudness
+    """
+    frames = data_.shape[0]
+    if frames == 0:
+        return Loudness(0.0, 0.0, SILENCE)
+
+    peak = float(numpy.abs(data_).max())
+    rms = float(numpy.sqrt(numpy.mean(numpy.square(data_, dtype=numpy.float64))))
+
+    # K-WEIGHTED POWER, SUMMED OVER THE CHANNELS
+    w = 2.0 * numpy.pi * numpy.arange(frames // 2 + 1) / frames
+    response = k_weighting(frequency_, w)
+    power = numpy.zeros(frames, dtype=numpy.float64)
+    for c in range(data_.shape[1]):
+        weighted = numpy.fft.irfft(numpy.fft.rfft(data_[:, c]) * response, n=frames)
+        power += weighted * weighted
+
+    # 400 MS GATING BLOCKS (75% OVERLAP)
+    block = int(0.4 * frequency_)
+    step = max(block // 4, 1)
+    if frames <= block:
+        blocks = numpy.array([power.mean()])
+    else:
+        cumulative = numpy.concatenate(([0.0], numpy.cumsum(power)))
+        starts = numpy.arange(0, frames - block + 1, step)
+        blocks = (cumulative[starts + block] - cumulative[starts]) / block
+
+    with numpy.errstate(divide='ignore'):
+        levels = -0.691 + 10.0 * numpy.log10(blocks)
+
+    gated = blocks[levels > SILENCE]
+    if gated.size == 0:
+        return Loudness(peak, rms, SILENCE)
+    relative = -0.691 + 10.0 * numpy.log10(gated.mean()) - 10.0
+    gated = blocks[(levels > SILENCE) & (levels > relative)]
+    loudness = -0.691 + 10.0 * numpy.log10(gated.mean())
+
+    return Loudness(peak, rms, max(float(loudness), SILENCE))
+
+
+class LoudnessAnalyzer:
+
+    def __init__(self, cache_file_: str = None):
+        """
+        ANALYZE THE LOUDNESS OF PYGAME SOUNDS, RESULTS ARE CACHED IN MEMORY AND IN A SIDECAR FILE
+
+        :param cache_file_: string | None; JSON file caching the results (keyed by content hash),
+                            None keep the results in memory only
+        """
+        if mixer.get_init() is None:
+            raise ValueError("\nMixer has not been initialized."
+                             "\nUse pygame.mixer.init() before starting the loudness analyzer")
+
+        self.cache_file = cache_file_
+        self.cache      = {}                                # content hash -> Loudness
+        self.sounds     = weakref.WeakKeyDictionary()       # sound -> Loudness (no hashing)
+        self.dirty      = False
+
+        if cache_file_ is not None and os.path.isfile(cache_file_):
+            with open(cache_file_, 'r') as f:
+                for key, value in json.load(f).items():
+                    self.cache[key] = Loudness(*value)
+
+    def content_hash(self, sound_):
+        """
+        RETURN THE HASH OF A SOUND CONTENT (RAW SAMPLES AND MIXER FORMAT)
+
+        :param sound_: pygame.mixer.Sound; sound
+        :return      : string; hexadecimal digest
+        """
+        digest = hashlib.sha1(sound_.get_raw())
+        digest.update(repr(mixer.get_init()).encode())
+        return digest.hexdigest()
+
+    def analyze(self, sound_, save_: bool = True):
+        """
+        RETURN THE LOUDNESS OF A SOUND (ANALYSIS RUNS ONLY IF THE SOUND IS NOT CACHED)
+
+        :param sound_: pygame.mixer.Sound; sound to analyze
+        :param save_ : bool; write the sidecar file after a new analysis
+        :return      : Loudness; (peak, rms, loudness)
+        """
+        result = self.sounds.get(sound_)
+        if result is not None:
+            return result
+
+        assert isinstance(sound_, pygame.mixer.Sound), \
+            "\nPositional argument sound_ must be a pygame.mixer.Sound type, got %s " % type(sound_)
+
+        key = self.content_hash(sound_)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.cache[key] = measure(sound_to_array(sound_), mixer.get_init()[0])
+            self.dirty = True
+            if save_:
+                self.save()
+
+        self.sounds[sound_] = result
+        return result
+
+    def analyze_all(self, sounds_):
+        """
+        ANALYZE A COLLECTION OF SOUNDS AND WRITE THE SIDECAR FILE ONCE
+
+        :param sounds_: iterable; pygame.mixer.Sound objects
+        :return       : list; Loudness of each sound
+        """
+        results = [self.analyze(sound, save_=False) for sound in sounds_]
+        self.save()
+        return results
+
+    def gain(self, sound_, target_: float):
+        """
+        RETURN THE LINEAR GAIN BRINGING A SOUND TO A TARGET LOUDNESS
+
+        :param sound_ : pygame.mixer.Sound; sound
+        :param target_: float; target loudness in LUFS e.g -23.0
+        :return       : float; linear gain (can exceed 1.0)
+        """
+        return 10.0 ** ((target_ - self.analyze(sound_).loudness) / 20.0)
+
+    def save(self):
+        """ WRITE THE SIDECAR FILE (ONLY WHEN NEW RESULTS HAVE BEEN ADDED) """
+        if self.cache_file is None or not self.dirty:
+            return
+        temp = self.cache_file + ".tmp"
+        with open(temp, 'w') as f:
+            json.dump({key: list(value) for key, value in self.cache.items()}, f)
+        os.replace(temp, self.cache_file)
+        self.dirty = False
@@ -0,0 +1,395 @@
+# encoding: utf-8
+
+"""
+MIXER BACKENDS FOR THE SOUND CONTROLLER
+
+SoundControl drives its channels through a mixer backend. A backend exposes the methods of the
+pygame.mixer module used by the controller (get_init, get_num_channels, set_num_channels,
+set_reserved, Channel) plus a clock (get_time), the channels expose the pygame.mixer.Channel
+methods (play, stop, pause, unpause, fadeout, set_volume, get_volume, get_busy, get_sound,
+queue, get_queue).
+
+MixerBackend and BackendChannel are the abstract interfaces (pygame.mixer.Channel is registered as
+a BackendChannel). VirtualBackend implements the channel bookkeeping of the backends whose channels
+are python objects.
+
+PygameBackend  : default backend, pygame.mixer channels (sound card)
+NullBackend    : no audio at all, channels only track the sound durations in pure python
+                 (headless servers, large scale tests with thousands of virtual channels)
+OfflineMixer   : offline rendering into numpy buffers / WAV file (see SoundRender.py)
+
+e.g
+    BACKEND = NullBackend(realtime_=False)
+    SND = SoundControl(pygame.Rect(0, 0, 800, 1024), 4096, mixer_=BACKEND)
+    SND.play(NullSound(2.5), 0, name_="EXPLOSION")
+    BACKEND.advance(1.0 / 60.0)
+    SND.update()
+"""
+
+try:
+    import pygame
+    from pygame import mixer
+except ImportError:
+    raise ImportError("\n<pygame> library is missing on your system."
+          "\nTry: \n   C:\\pip install pygame on a window command prompt.")
+
+from abc import ABC, abstractmethod
+from time import time
+
+
+class BackendChannel(ABC):
+    """
+    CHANNEL INTERFACE (SAME METHODS THAN PYGAME.MIXER.CHANNEL)
+    """
+
+    @abstractmethod
+    def play(self, sound_, loops=0, maxtime=0, fade_ms=0):
+        """ PLAY A SOUND ON THE CHANNEL """
+        ...
+
+    @abstractmethod
+    def stop(self):
+        """ STOP THE PLAYBACK (THE QUEUED SOUND IS ALSO REMOVED) """
+        ...
+
+    @abstractmethod
+    def pause(self):
+        """ PAUSE THE PLAYBACK """
+        ...
+
+    @abstractmethod
+    def unpause(self):
+        """ RESUME A PAUSED PLAYBACK """
+        ...
+
+    @abstractmethod
+    def fadeout(self, time_):
+        """ STOP THE PLAYBACK AFTER FADING OUT THE CHANNEL OVER time_ MILLISECONDS """
+        ...
+
+    @abstractmethod
+    def set_volume(self, value_, right_=None):
+        """ SET THE CHANNEL VOLUME, WITH TWO ARGUMENTS SET THE STEREO PANNING (LEFT, RIGHT) """
+        ...
+
+    @abstractmethod
+    def get_volume(self):
+        """ RETURN THE CHANNEL VOLUME """
+        ...
+
+    @abstractmethod
+    def get_busy(self):
+        """ RETURN TRUE IF THE CHANNEL IS PLAYING (OR PAUSED) """
+        ...
+
+    @abstractmethod
+    def get_sound(self):
+        """ RETURN THE SOUND BEING PLAYED (NONE WHEN THE CHANNEL IS IDLE) """
+        ...
+
+    @abstractmethod
+    def queue(self, sound_):
+        """ QUEUE A SOUND, THE SOUND START AS SOON AS THE CURRENT SOUND FINISHES """
+        ...
+
+    @abstractmethod
+    def get_queue(self):
+        """ RETURN THE QUEUED SOUND (NONE IF NOTHING IS QUEUED) """
+        ...
+
+
+# PYGAME CHANNELS IMPLEMENT THE INTERFACE
+BackendChannel.register(mixer.Channel)
+
+
+class MixerBackend(ABC):
+    """
+    MIXER INTERFACE (SAME METHODS THAN THE PYGAME.MIXER MODULE) PLUS THE CLOCK USED FOR THE SOUND
+    TIMESTAMPS (WALL CLOCK BY DEFAULT)
+    """
+
+    @abstractmethod
+    def get_init(self):
+        """ RETURN THE MIXER FORMAT (FREQUENCY, SIZE, CHANNELS), NONE IF THE MIXER IS NOT INITIALIZED """
+        ...
+
+    @abstractmethod
+    def get_num_channels(self):
+        """ RETURN THE NUMBER OF PLAYBACK CHANNELS """
+        ...
+
+    @abstractmethod
+    def set_num_channels(self, count_: int):
+        """ SET THE NUMBER OF PLAYBACK CHANNELS """
+        ...
+
+    @abstractmethod
+    def set_reserved(self, count_: int):
+        """ RESERVE CHANNELS, RETURN THE NUMBER OF RESERVED CHANNELS """
+        ...
+
+    @abstractmethod
+    def Channel(self, id_: int):
+        """ RETURN THE CHANNEL OBJECT (BackendChannel) FOR A GIVEN CHANNEL NUMBER """
+        ...
+
+    @abstractmethod
+    def get_busy(self):
+        """ RETURN TRUE IF ANY CHANNEL IS PLAYING """
+        ...
+
+    @abstractmethod
+    def stop(self):
+        """ STOP ALL CHANNELS """
+        ...
+
+    def get_time(self):
+        """ RETURN THE BACKEND CLOCK IN SECONDS """
+        return time()
+
+
+class VirtualBackend(MixerBackend):
+    """
+    CHANNEL BOOKKEEPING SHARED BY THE BACKENDS WHOSE CHANNELS ARE PYTHON OBJECTS
+    (CHANNELS ARE CREATED ON DEMAND WITH create_channel)
+    """
+
+    def __init__(self):
+        self.num_channels = 8                   # pygame default number of channels
+        self.reserved     = 0                   # reserved channels
+        self.channels     = {}                  # channel objects (created on demand)
+
+    @abstractmethod
+    def create_channel(self, id_: int):
+        """ CREATE THE CHANNEL OBJECT FOR A GIVEN CHANNEL NUMBER """
+        ...
+
+    def get_num_channels(self):
+        """ RETURN THE NUMBER OF PLAYBACK CHANNELS """
+        return self.num_channels
+
+    def set_num_channels(self, count_: int):
+        """
+        SET THE NUMBER OF PLAYBACK CHANNELS, CHANNELS ABOVE THE NEW LIMIT ARE STOPPED
+
+        :param count_: integer; number of channels
+        """
+        for c in list(self.channels):
+            if c >= count_:
+                self.channels.pop(c).stop()
+        self.num_channels = count_
+
+    def set_reserved(self, count_: int):
+        """ RESERVE CHANNELS, RETURN THE NUMBER OF RESERVED CHANNELS """
+        self.reserved = min(count_, self.num_channels)
+        return self.reserved
+
+    def Channel(self, id_: int):
+        """
+        RETURN THE CHANNEL OBJECT FOR A GIVEN CHANNEL NUMBER
+
+        :param id_: integer; channel number in range [0 ... get_num_channels() - 1]
+        """
+        if not 0 <= id_ < self.num_channels:
+            raise IndexError("\nChannel number out of range, got %s " % id_)
+        channel = self.channels.get(id_)
+        if channel is None:
+            channel = self.channels[id_] = self.create_channel(id_)
+        return channel
+
+    def get_busy(self):
+        """ RETURN TRUE IF ANY CHANNEL IS PLAYING """
+        for channel in self.channels.values():
+            if channel.get_busy():
+                return True
+        return False
+
+    def stop(self):
+        """ STOP ALL CHANNELS """
+        for channel in self.channels.values():
+            channel.stop()
+
+
+class PygameBackend(MixerBackend):
+    """
+    DEFAULT BACKEND, DELEGATE TO THE PYGAME.MIXER MODULE (CHANNELS ARE PYGAME.MIXER.CHANNEL OBJECTS)
+    """
+
+    def get_init(self):
+        return mixer.get_init()
+
+    def get_num_channels(self):
+        return mixer.get_num_channels()
+
+    def set_num_channels(self, count_: int):
+        mixer.set_num_channels(count_)
+
+    def set_reserved(self, count_: int):
+        return mixer.set_reserved(count_)
+
+    def Channel(self, id_: int):
+        return mixer.Channel(id_)
+
+    def get_busy(self):
+        return mixer.get_busy()
+
+    def stop(self):
+        mixer.stop()
+
+
+class NullSound:
+
+    def __init__(self, length_: float, name_: str = None):
+        """
+        STAND-IN FOR A PYGAME.MIXER.SOUND WHEN NO AUDIO DEVICE IS AVAILABLE (ONLY THE LENGTH IS KNOWN)
+
+        :param length_: float; sound length in seconds
+        :param name_  : string | None; sound name (e.g the file name), for information only
+        """
+        assert length_ >= 0, "\nArgument length_ must be >= 0"
+        self.length = float(length_)
+        self.name   = name_
+        self.volume = 1.0
+
+    def get_length(self):
+        """ RETURN THE LENGTH OF THE SOUND IN SECONDS """
+        return self.length
+
+    def get_volume(self):
+        """ RETURN THE SOUND VOLUME """
+        return self.volume
+
+    def set_volume(self, value_: float):
+        """ SET THE SOUND VOLUME """
+        self.volume = value_
+
+
+class NullChannel(BackendChannel):
+
+    def __init__(self, mixer_, id_: int):
+        """
+        VIRTUAL CHANNEL WITHOUT AUDIO, THE PLAYBACK IS REDUCED TO THE SOUND END TIME
+
+        :param mixer_: NullBackend; backend owning the channel
+        :param id_   : integer; channel number
+        """
+        self.clock     = mixer_.get_time
+        self.id        = id_
+        self.sound     = None            # sound being played
+        self.queued    = None            # sound to play after the current one
+        self.end       = 0.0             # end of the playback (backend clock), inf for endless loops
+        self.paused_at = None            # pause time, None when the channel is not paused
+        self.volume    = 1.0
+        self.left      = 1.0
+        self.right     = 1.0
+
+    def refresh(self, now_: float):
+        """ FINISH THE SOUND (OR START THE QUEUED SOUND) WHEN ITS END TIME IS REACHED """
+        while self.sound is not None and self.paused_at is None and now_ >= self.end:
+            queued = self.queued
+            if queued is None:
+                self.sound = None
+                break
+            self.queued = None
+            self.sound  = queued
+            self.end   += queued.get_length()
+
+    def play(self, sound_, loops=0, maxtime=0, fade_ms=0):
+        now    = self.clock()
+        length = sound_.get_length()
+        self.sound     = sound_
+        self.queued    = None
+        self.paused_at = None
+        self.end       = now + length * (loops + 1) if loops >= 0 else float('inf')
+        if maxtime > 0:
+            self.end = min(self.end, now + maxtime / 1000.0)
+
+    def stop(self):
+        self.sound     = None
+        self.queued    = None
+        self.paused_at = None
+
+    def pause(self):
+        if self.get_busy() and self.paused_at is None:
+            self.paused_at = self.clock()
+
+    def unpause(self):
+        if self.paused_at is not None:
+            self.end += self.clock() - self.paused_at
+            self.paused_at = None
+
+    def fadeout(self, time_):
+        if not self.get_busy():
+            return
+        if time_ <= 0:
+            self.stop()
+            return
+        self.queued = None
+        self.end = min(self.end, self.clock() + time_ / 1000.0)
+
+    def set_volume(self, value_, right_=None):
+        if right_ is None:
+            self.volume = value_
+            self.left   = 1.0
+            self.right  = 1.0
+        else:
+            self.volume = 1.0
+            self.left   = value_
+            self.right  = right_
+
+    def get_volume(self):
+        return self.volume
+
+    def get_busy(self):
+        if self.sound is not None:
+            self.refresh(self.clock())
+        return self.sound is not None
+
+    def get_sound(self):
+        return self.sound if self.get_busy() else None
+
+    def queue(self, sound_):
+        if self.get_busy():
+            self.queued = sound_
+        else:
+            self.play(sound_)
+
+    def get_queue(self):
+        return self.queued if self.get_busy() else None
+
+
+class NullBackend(VirtualBackend):
+
+    def __init__(self, realtime_: bool = True, frequency_: int = 44100, size_: int = -16, channels_: int = 2):
+        """
+        BACKEND WITHOUT AUDIO, CHANNELS TRACK THE SOUND DURATIONS IN PURE PYTHON.
+        NO AUDIO DEVICE AND NO PYGAME MIXER INITIALIZATION ARE REQUIRED
+
+        :param realtime_ : bool; True the backend clock is the wall clock, False the clock is virtual
+                           and moves forward with advance()
+        :param frequency_: integer; frequency returned by get_init
+        :param size_     : integer; sample size returned by get_init
+        :param channels_ : integer; number of output channels returned by get_init
+        """
+        VirtualBackend.__init__(self)
+        self.format   = (frequency_, size_, channels_)
+        self.realtime = realtime_
+        self.now      = 0.0                 # virtual clock (seconds)
+
+    def get_init(self):
+        return self.format
+
+    def create_channel(self, id_: int):
+        return NullChannel(self, id_)
+
+    def get_time(self):
+        """ RETURN THE BACKEND CLOCK IN SECONDS (WALL CLOCK OR VIRTUAL CLOCK) """
+        return time() if self.realtime else self.now
+
+    def advance(self, seconds_: float):
+        """
+        MOVE THE VIRTUAL CLOCK FORWARD (NO EFFECT IN REAL TIME MODE)
+
+        :param seconds_: float; duration in seconds
+        """
+        self.now += seconds_
@@ -0,0 +1,276 @@
+# encoding: utf-8
+
+"""
+PRERENDERED ENVIRONMENTAL EFFECTS
+
+The pygame mixer has no effect stage (reverb, echo, filters) and processing the samples in python
+at every play is far too slow. EffectCache renders an effect (FFT convolution with an impulse
+response, feedback echo, band-pass filter) into a new sound with numpy the first time a sound is
+played with a given preset, the result is kept in a LRU cache. The next plays cost the same as a
+normal play.
+
+Effects are described with namedtuples :
+    Reverb(decay, predelay, damping, wet) : synthetic impulse response (exponentially decaying noise)
+    Convolution(impulse, wet)            : impulse response (pygame.mixer.Sound or float array)
+    Echo(delay, feedback, wet)           : feedback echo
+    Filter(low, high)                    : band-pass filter e.g radio, telephone
+
+e.g
+    EFFECTS = EffectCache(budget_mb_=64.0)
+    EFFECTS.add_preset("church", Convolution(pygame.mixer.Sound("church_ir.wav"), 0.4))
+    SND.set_effect_cache(EFFECTS)
+    SND.play(sound1, 0, effect_="cave")
+"""
+
+try:
+    import pygame
+    from pygame import mixer, sndarray
+except ImportError:
+    raise ImportError("\n<pygame> library is missing on your system."
+          "\nTry: \n   C:\\pip install pygame on a window command prompt.")
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("\n<numpy> library is missing on your system."
+          "\nTry: \n   C:\\pip install numpy on a window command prompt.")
+
+from math import ceil, log
+from collections import OrderedDict, namedtuple
+
+from SoundRender import sound_to_array, array_to_mixer
+from SoundVariant import lowpass
+
+
+# decay : reverberation time in seconds (-60 dB), predelay : seconds, damping : low-pass cutoff in Hz
+# applied to the impulse response (None no damping), wet : level of the processed signal [0.0 ... 1.0]
+Reverb = namedtuple("Reverb", ("decay", "predelay", "damping", "wet"))
+
+# impulse : pygame.mixer.Sound or float array (frames or frames x channels), wet : [0.0 ... 1.0]
+Convolution = namedtuple("Convolution", ("impulse", "wet"))
+
+# delay : seconds between echoes, feedback : gain of each repetition [0.0 ... 1.0[, wet : level of the echoes
+Echo = namedtuple("Echo", ("delay", "feedback", "wet"))
+
+# low, high : band-pass cutoff frequencies in Hz
+Filter = namedtuple("Filter", ("low", "high"))
+
+PRESETS = {
+    "room"  : Reverb(0.4, 0.005, 8000.0, 0.25),
+    "hall"  : Reverb(1.8, 0.02, 6000.0, 0.35),
+    "cave"  : Reverb(3.0, 0.04, 3000.0, 0.5),
+    "echo"  : Echo(0.3, 0.4, 0.5),
+    "canyon": Echo(0.6, 0.5, 0.6),
+    "radio" : Filter(300.0, 3400.0),
+}
+
+# LEVEL OF THE LAST ECHO REPETITION (-60 dB)
+_ECHO_FLOOR = 1e-3
+
+
+def impulse_response(decay_: float, predelay_: float, damping_, frequency_: int, channels_: int, seed_: int = 0):
+    """
+    RETURN A SYNTHETIC REVERB IMPULSE RESPONSE (EXPONENTIALLY DECAYING NOISE, DECORRELATED CHANNELS).
+    THE ENERGY OF EACH CHANNEL IS NORMALISED TO 1.0
+
+    :param decay_    : float; reverberation time in seconds (the response decays by 60 dB)
+    :param predelay_ : float; delay before the response in seconds
+    :param damping_  : float | None; low-pass cutoff in Hz (darker tail), None no damping
+    :param frequency_: integer; sample rate
+    :param channels_ : integer; number of channels
+    :param seed_     : integer; random seed (same seed, same response)
+    :return          : numpy.ndarray; float32 impulse response (frames x channels)
+    """
+    assert decay_ > 0, "\nArgument decay_ must be > 0"
+    frames = max(int(decay_ * frequency_), 1)
+    envelope = 10.0 ** (-3.0 * numpy.arange(frames) / float(frames))
+    noise = numpy.random.default_rng(seed_).standard_normal((frames, channels_))
+    response = (noise * envelope[:, None]).astype(numpy.float32)
+    if damping_ is not None:
+        response = lowpass(response, damping_, frequency_)
+    response = numpy.concatenate(
+        (numpy.zeros((int(predelay_ * frequency_), channels_), dtype=numpy.float32), response))
+    energy = numpy.sqrt(numpy.sum(numpy.square(response, dtype=numpy.float64), axis=0))
+    return response / numpy.maximum(energy, 1e-12).astype(numpy.float32)
+
+
+def convolve(data_, impulse_, wet_: float):
+    """
+    CONVOLVE A SAMPLE ARRAY WITH AN IMPULSE RESPONSE (FFT, ALL CHANNELS AT ONCE).
+    THE OUTPUT IS LONGER THAN THE INPUT (REVERB TAIL)
+
+    :param data_   : numpy.ndarray; float32 samples (frames x channels)
+    :param impulse_: numpy.ndarray; impulse response (frames or frames x channels), a mono response is
+                     applied to every channel, other channel counts are downmixed to mono
+    :param wet_    : float; level of the processed signal [0.0 ... 1.0], the dry level is 1.0 - wet_
+    :return        : numpy.ndarray; float32 samples
+    """
+    if impulse_.ndim == 1:
+        impulse_ = impulse_.reshape(-1, 1)
+    if impulse_.shape[1] not in (1, data_.shape[1]):
+        impulse_ = impulse_.mean(axis=1, keepdims=True)
+
+    frames = data_.shape[0] + impulse_.shape[0] - 1
+    size = 1 << (frames - 1).bit_length()
+    spectrum = numpy.fft.rfft(data_, n=size, axis=0) * numpy.fft.rfft(impulse_, n=size, axis=0)
+    output = numpy.fft.irfft(spectrum, n=size, axis=0)[:frames] * wet_
+    output[:data_.shape[0]] += data_ * (1.0 - wet_)
+    return output.astype(numpy.float32)
+
+
+def echo(data_, delay_: float, feedback_: float, wet_: float, frequency_: int):
+    """
+    FEEDBACK ECHO, SUM OF DELAYED COPIES OF THE SIGNAL (EACH REPETITION SCALED BY feedback_)
+    UNTIL THE REPETITIONS FALL BELOW -60 DB
+
+    :param data_     : numpy.ndarray; float32 samples (frames x channels)
+    :param delay_    : float; delay between two repetitions in seconds
+    :param feedback_ : float; gain of each repetition in range [0.0 ... 1.0[
+    :param wet_      : float; level of the first echo
+    :param frequency_: integer; sample rate
+    :return          : numpy.ndarray; float32 samples
+    """
+    assert 0.0 <= feedback_ < 1.0, "\nArgument feedback_ must be in range [0.0 ... 1.0["
+    shift = max(int(delay_ * frequency_), 1)
+    repeats = 1 if feedback_ == 0.0 else max(int(ceil(log(_ECHO_FLOOR) / log(feedback_))), 1)
+    frames = data_.shape[0]
+    output = numpy.zeros((frames + repeats * shift, data_.shape[1]), dtype=numpy.float32)
+    output[:frames] = data_
+    gain = wet_
+    for k in range(1, repeats + 1):
+        output[k * shift:k * shift + frames] += data_ * numpy.float32(gain)
+        gain *= feedback_
+    return output
+
+
+def apply_effect(data_, effect_, frequency_: int, impulse_=None):
+    """
+    APPLY AN EFFECT TO A SAMPLE ARRAY, THE RESULT IS SCALED DOWN WHEN IT WOULD CLIP
+
+    :param data_     : numpy.ndarray; float32 samples (frames x channels)
+    :param effect_   : Reverb | Convolution | Echo | Filter; effect description
+    :param frequency_: integer; sample rate
+    :param impulse_  : numpy.ndarray | None; impulse response of a Reverb effect (see impulse_response),
+                       None build the response
+    :return          : numpy.ndarray; float32 samples
+    """
+    if isinstance(effect_, Reverb):
+        if impulse_ is None:
+            impulse_ = impulse_response(
+                effect_.decay, effect_.predelay, effect_.damping, frequency_, data_.shape[1])
+        output = convolve(data_, impulse_, effect_.wet)
+    elif isinstance(effect_, Convolution):
+        impulse = effect_.impulse
+        if isinstance(impulse, pygame.mixer.Sound):
+            impulse = sound_to_array(impulse)
+        output = convolve(data_, numpy.asarray(impulse, dtype=numpy.float32), effect_.wet)
+    elif isinstance(effect_, Echo):
+        output = echo(data_, effect_.delay, effect_.feedback, effect_.wet, frequency_)
+    elif isinstance(effect_, Filter):
+        output = lowpass(data_, effect_.high, frequency_, 255) - lowpass(data_, effect_.low, frequency_, 255)
+    else:
+        raise ValueError("\nUnknown effect type, got %s " % type(effect_))
+
+    peak = float(numpy.abs(output).max()) if output.size else 0.0
+    if peak > 1.0:
+        output /= peak
+    return output
+
+
+class EffectCache:
+
+    def __init__(self, budget_mb_: float = 64.0):
+        """
+        PRERENDER SOUNDS WITH AN EFFECT PRESET AND KEEP THE RESULTS IN A LRU CACHE
+
+        :param budget_mb_: float; memory budget in megabytes for the rendered sounds, the least recently
+                           used results are evicted when the budget is exceeded
+        """
+        if mixer.get_init() is None:
+            raise ValueError("\nMixer has not been initialized."
+                             "\nUse pygame.mixer.init() before starting the effect cache")
+
+        assert budget_mb_ > 0, "\nArgument budget_mb_ must be > 0"
+
+        self.budget   = int(budget_mb_ * 1024 * 1024)  # budget in bytes
+        self.presets  = dict(PRESETS)                  # preset name -> effect
+        self.cache    = OrderedDict()                  # (sound, preset) -> (rendered sound, size in bytes)
+        self.size     = 0                              # memory used by the rendered sounds in bytes
+        self.impulses = {}                             # (preset, frequency, channels) -> reverb impulse response
+        self.hits     = 0
+        self.misses   = 0
+
+    def add_preset(self, name_: str, effect_) -> None:
+        """
+        ADD OR REPLACE AN EFFECT PRESET (SOUNDS RENDERED WITH A REPLACED PRESET ARE DISCARDED)
+
+        :param name_  : string; preset name e.g "church"
+        :param effect_: Reverb | Convolution | Echo | Filter; effect description
+        :return       : None
+        """
+        assert isinstance(effect_, (Reverb, Convolution, Echo, Filter)), \
+            "\nArgument effect_ must be a Reverb, Convolution, Echo or Filter type, got %s " % type(effect_)
+        for key in [key for key in self.cache if key[1] == name_]:
+            self.size -= self.cache.pop(key)[1]
+        for key in [key for key in self.impulses if key[0] == name_]:
+            del self.impulses[key]
+        self.presets[name_] = effect_
+
+    def impulse(self, preset_: str, frequency_: int, channels_: int):
+        """
+        RETURN THE IMPULSE RESPONSE OF A REVERB PRESET (BUILT ONCE PER SAMPLE RATE AND CHANNEL COUNT)
+
+        :param preset_   : string; name of a Reverb preset
+        :param frequency_: integer; sample rate
+        :param channels_ : integer; number of channels
+        :return          : numpy.ndarray; float32 impulse response (frames x channels)
+        """
+        key = (preset_, frequency_, channels_)
+        impulse = self.impulses.get(key)
+        if impulse is None:
+            effect = self.presets[preset_]
+            impulse = self.impulses[key] = impulse_response(
+                effect.decay, effect.predelay, effect.damping, frequency_, channels_)
+        return impulse
+
+    def get(self, sound_, preset_: str):
+        """
+        RETURN A SOUND RENDERED WITH AN EFFECT PRESET (RENDERED ON THE FIRST CALL, CACHED AFTERWARD)
+
+        :param sound_ : pygame.mixer.Sound; dry sound
+        :param preset_: string; preset name e.g "cave", "hall", "radio"
+        :return       : pygame.mixer.Sound; processed sound
+        """
+        key = (sound_, preset_)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        assert isinstance(sound_, pygame.mixer.Sound), \
+            "\nPositional argument sound_ must be a pygame.mixer.Sound type, got %s " % type(sound_)
+        effect = self.presets.get(preset_)
+        if effect is None:
+            raise ValueError("\nUnknown effect preset %s " % repr(preset_))
+
+        self.misses += 1
+        frequency = mixer.get_init()[0]
+        data = sound_to_array(sound_)
+        impulse = self.impulse(preset_, frequency, data.shape[1]) if isinstance(effect, Reverb) else None
+        array = array_to_mixer(apply_effect(data, effect, frequency, impulse))
+        rendered = sndarray.make_sound(array)
+
+        # KEEP THE MEMORY WITHIN THE BUDGET (THE NEW RESULT IS ALWAYS KEPT)
+        while self.cache and self.size + array.nbytes > self.budget:
+            self.size -= self.cache.popitem(last=False)[1][1]
+
+        self.cache[key] = (rendered, array.nbytes)
+        self.size += array.nbytes
+        return rendered
+
+    def clear(self) -> None:
+        """ DISCARD ALL THE RENDERED SOUNDS AND THE REVERB IMPULSE RESPONSES """
+        self.cache.clear()
+        self.impulses.clear()
+        self.size = 0
@@ -0,0 +1,426 @@
+# encoding: utf-8
+
+"""
+OFFLINE RENDERING FOR THE SOUND CONTROLLER
+
+OfflineMixer is a mixer backend (see SoundBackend.py) mimicking the part of the pygame.mixer module
+used by SoundControl (get_init, get_num_channels, set_num_channels, set_reserved, Channel) but does
+not play anything on a sound card. Sounds are mixed into numpy buffers (samples taken from
+pygame.sndarray) as fast as the CPU allows and written into a WAV file. The mixer owns a virtual
+clock that only moves when advance() is called, SoundControl use that clock for the sound timestamps.
+
+e.g
+    pygame.mixer.init()   # SDL_AUDIODRIVER=dummy on a headless box
+    MIXER = OfflineMixer(wav_="session.wav")
+    SND = SoundControl(pygame.Rect(0, 0, 800, 1024), 8, mixer_=MIXER)
+    SND.play(sound1, 0, volume_=1.0, panning_=True, x_=400)
+    for frame in range(600 * 60):
+        SND.update()
+        MIXER.advance(1.0 / 60.0)
+    MIXER.close()
+"""
+
+try:
+    import pygame
+    from pygame import mixer, sndarray
+except ImportError:
+    raise ImportError("\n<pygame> library is missing on your system."
+          "\nTry: \n   C:\\pip install pygame on a window command prompt.")
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("\n<numpy> library is missing on your system."
+          "\nTry: \n   C:\\pip install numpy on a window command prompt.")
+
+import wave
+import weakref
+
+from SoundBackend import BackendChannel, VirtualBackend
+
+
+def sound_to_array(sound_):
+    """
+    RETURN THE SAMPLES OF A SOUND NORMALISED IN RANGE [-1.0 ... 1.0] (FLOAT32, FRAMES x CHANNELS)
+
+    :param sound_: pygame.mixer.Sound; sound
+    :return      : numpy.ndarray
+    """
+    array = sndarray.array(sound_)
+    if array.dtype.kind == 'u':
+        half = float(1 << (array.dtype.itemsize * 8 - 1))
+        data = (array.astype(numpy.float32) - half) / half
+    elif array.dtype.kind == 'i':
+        data = array.astype(numpy.float32) / float(1 << (array.dtype.itemsize * 8 - 1))
+    else:
+        data = array.astype(numpy.float32)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    return data
+
+
+def array_to_mixer(data_):
+    """
+    CONVERT SAMPLES IN RANGE [-1.0 ... 1.0] (FLOAT32, FRAMES x CHANNELS) INTO THE MIXER FORMAT.
+    THE NUMBER OF CHANNELS MUST MATCH THE MIXER (SEE pygame.mixer.get_init)
+
+    :param data_: numpy.ndarray; samples (values out of range are clipped)
+    :return     : numpy.ndarray; contiguous array ready for pygame.sndarray.make_sound
+    """
+    size = mixer.get_init()[1]
+    bits = abs(size)
+    if size == 32:
+        array = data_.astype(numpy.float32)
+    elif size < 0:
+        array = (numpy.clip(data_, -1.0, 1.0) * ((1 << (bits - 1)) - 1)).astype('int%s' % bits)
+    else:
+        half = 1 << (bits - 1)
+        array = (numpy.clip(data_, -1.0, 1.0) * (half - 1) + half).astype('uint%s' % bits)
+
+    if array.shape[1] == 1:
+        array = array[:, 0]
+
+    return numpy.ascontiguousarray(array)
+
+
+def array_to_sound(data_):
+    """
+    CONVERT SAMPLES IN RANGE [-1.0 ... 1.0] (FLOAT32, FRAMES x CHANNELS) INTO A PYGAME SOUND
+
+    :param data_: numpy.ndarray; samples (values out of range are clipped)
+    :return     : pygame.mixer.Sound
+    """
+    return sndarray.make_sound(array_to_mixer(data_))
+
+
+class OfflineChannel(BackendChannel):
+
+    # VIRTUAL CLOCK, A STREAM WAITS FOR ITS WORKER RATHER THAN DROPPING DATA (see SoundStream.update)
+    realtime = False
+
+    def __init__(self, mixer_, id_: int):
+        """
+        VIRTUAL CHANNEL BEHAVING LIKE A PYGAME.MIXER.CHANNEL (PLAY, STOP, PAUSE, FADE, VOLUME & QUEUE).
+        THE CHANNEL DOES NOT PRODUCE ANY SOUND ON ITS OWN, ITS SAMPLES ARE PULLED BY THE OFFLINE MIXER
+
+        :param mixer_: OfflineMixer; mixer owning the channel
+        :param id_   : integer; channel number
+        """
+        self.mixer         = mixer_          # mixer owning the channel
+        self.id            = id_             # channel number
+        self.sound         = None            # sound being played
+        self.data          = None            # sound samples (float32 array, frames x channels)
+        self.queued        = None            # sound to play after the current one
+        self.pos           = 0               # position (frame) in the sound samples
+        self.loops         = 0               # remaining loops, -1 loop indefinitely
+        self.maxtime       = -1              # remaining frames before halting, -1 no limit
+        self.paused        = False
+        self.volume        = 1.0             # channel volume
+        self.left          = 1.0             # stereo panning (left)
+        self.right         = 1.0             # stereo panning (right)
+        self.fade_in       = 0               # fade in length (frames)
+        self.fade_in_pos   = 0               # frames played since the beginning of the fade in
+        self.fade_out      = 0               # fade out length (frames)
+        self.fade_out_left = 0               # frames left before the end of the fade out
+
+    def _start(self, sound_, loops_, maxtime_, fade_ms_):
+        """ LOAD A SOUND ON THE CHANNEL (RESET THE PLAYBACK STATE) """
+        ms_to_frames       = self.mixer.ms_to_frames
+        self.sound         = sound_
+        self.data          = self.mixer.get_samples(sound_)
+        self.pos           = 0
+        self.loops         = loops_
+        self.maxtime       = ms_to_frames(maxtime_) if maxtime_ > 0 else -1
+        self.paused        = False
+        self.fade_in       = ms_to_frames(fade_ms_) if fade_ms_ > 0 else 0
+        self.fade_in_pos   = 0
+        self.fade_out      = 0
+        self.fade_out_left = 0
+
+    def play(self, sound_, loops=0, maxtime=0, fade_ms=0):
+        """
+        PLAY A SOUND ON THE CHANNEL (SAME SIGNATURE THAN PYGAME.MIXER.CHANNEL.PLAY)
+
+        :param sound_ : pygame.mixer.Sound; sound to play
+        :param loops  : integer; number of repeat after the first play, -1 loop indefinitely
+        :param maxtime: integer; stop the playback after maxtime milliseconds (0 no limit)
+        :param fade_ms: integer; fade in duration in milliseconds
+        """
+        self._start(sound_, loops, maxtime, fade_ms)
+        self.queued = None
+
+    def stop(self):
+        """ STOP THE PLAYBACK (THE QUEUED SOUND IS ALSO REMOVED) """
+        self.sound         = None
+        self.data          = None
+        self.queued        = None
+        self.paused        = False
+        self.fade_out      = 0
+        self.fade_out_left = 0
+
+    def pause(self):
+        """ PAUSE THE PLAYBACK """
+        if self.sound is not None:
+            self.paused = True
+
+    def unpause(self):
+        """ RESUME A PAUSED PLAYBACK """
+        self.paused = False
+
+    def fadeout(self, time_):
+        """
+        STOP THE PLAYBACK AFTER FADING OUT THE CHANNEL OVER A GIVEN TIME
+
+        :param time_: integer; fade out duration in milliseconds (<= 0 stop immediately)
+        """
+        if self.sound is None:
+            return
+        if time_ <= 0:
+            self.stop()
+            return
+        self.fade_out      = self.mixer.ms_to_frames(time_)
+        self.fade_out_left = self.fade_out
+
+    def set_volume(self, value_, right_=None):
+        """
+        SET THE CHANNEL VOLUME, WITH TWO ARGUMENTS SET THE STEREO PANNING (LEFT, RIGHT)
+
+        :param value_: float; volume in range [0.0 ... 1.0] (left volume when right_ is defined)
+        :param right_: float | None; right volume in range [0.0 ... 1.0]
+        """
+        if right_ is None:
+            self.volume = min(max(float(value_), 0.0), 1.0)
+            self.left   = 1.0
+            self.right  = 1.0
+        else:
+            self.volume = 1.0
+            self.left   = min(max(float(value_), 0.0), 1.0)
+            self.right  = min(max(float(right_), 0.0), 1.0)
+
+    def get_volume(self):
+        """ RETURN THE CHANNEL VOLUME """
+        return self.volume
+
+    def get_busy(self):
+        """ RETURN TRUE IF THE CHANNEL IS PLAYING (OR PAUSED) """
+        return self.sound is not None
+
+    def get_sound(self):
+        """ RETURN THE SOUND BEING PLAYED (NONE WHEN THE CHANNEL IS IDLE) """
+        return self.sound
+
+    def queue(self, sound_):
+        """
+        QUEUE A SOUND, THE SOUND START AS SOON AS THE CURRENT SOUND FINISHES.
+        A SOUND QUEUED ON AN IDLE CHANNEL STARTS IMMEDIATELY
+
+        :param sound_: pygame.mixer.Sound; sound to queue
+        """
+        if self.sound is None:
+            self._start(sound_, 0, 0, 0)
+        else:
+            self.queued = sound_
+
+    def get_queue(self):
+        """ RETURN THE QUEUED SOUND (NONE IF NOTHING IS QUEUED) """
+        return self.queued
+
+    def mix(self, out_, frames_: int):
+        """
+        ADD THE NEXT frames_ SAMPLES OF THE CHANNEL TO THE BUFFER out_
+
+        :param out_   : numpy.ndarray; float32 buffer (frames x channels)
+        :param frames_: integer; number of frames to mix
+        """
+        written = 0
+
+        while self.sound is not None and not self.paused and written < frames_:
+
+            data  = self.data
+            total = data.shape[0]
+            if total == 0:
+                self.stop()
+                break
+
+            n = min(frames_ - written, total - self.pos)
+            if self.maxtime >= 0:
+                n = min(n, self.maxtime)
+            if self.fade_out:
+                n = min(n, self.fade_out_left)
+
+            gain  = self.mixer.gain(self.volume * self.sound.get_volume(), self.left, self.right)
+            block = data[self.pos:self.pos + n]
+
+            # FADE IN / FADE OUT ENVELOPE
+            if self.fade_in or self.fade_out:
+                ramp = numpy.arange(n, dtype=numpy.float32)
+                envelope = numpy.ones(n, dtype=numpy.float32)
+                if self.fade_in:
+                    envelope *= numpy.minimum((ramp + self.fade_in_pos) / self.fade_in, 1.0)
+                    self.fade_in_pos += n
+                    if self.fade_in_pos >= self.fade_in:
+                        self.fade_in = 0
+                if self.fade_out:
+                    envelope *= (self.fade_out_left - ramp) / self.fade_out
+                block = block * envelope[:, None]
+
+            out_[written:written + n] += block * gain
+
+            self.pos += n
+            written  += n
+
+            if self.maxtime >= 0:
+                self.maxtime -= n
+                if self.maxtime == 0:
+                    self.stop()
+                    break
+
+            if self.fade_out:
+                self.fade_out_left -= n
+                if self.fade_out_left <= 0:
+                    self.stop()
+                    break
+
+            # END OF THE SAMPLES, LOOP OR PLAY THE QUEUED SOUND
+            if self.pos >= total:
+                if self.loops != 0:
+                    if self.loops > 0:
+                        self.loops -= 1
+                    self.pos = 0
+                elif self.queued is not None:
+                    queued = self.queued
+                    self.queued = None
+                    self._start(queued, 0, 0, 0)
+                else:
+                    self.sound = None
+                    self.data  = None
+
+
+class OfflineMixer(VirtualBackend):
+
+    def __init__(self, wav_: str = None):
+        """
+        OFFLINE MIXER, RENDER THE CHANNELS INTO NUMPY BUFFERS FASTER THAN REAL TIME.
+        THE OUTPUT FORMAT (FREQUENCY, CHANNELS) IS THE PYGAME MIXER FORMAT, PYGAME MIXER MUST BE
+        INITIALIZED TO DECODE THE SOUNDS (USE SDL_AUDIODRIVER=dummy ON A HEADLESS SYSTEM)
+
+        :param wav_: string | None; WAV file to stream the rendering into (16 bit PCM).
+                     When None the rendering is kept in memory (see get_array and write_wav)
+        """
+        if mixer.get_init() is None:
+            raise ValueError("\nMixer has not been initialized."
+                             "\nUse pygame.mixer.init() before starting the offline mixer")
+
+        VirtualBackend.__init__(self)
+        self.frequency, self.size, self.channels_num = mixer.get_init()
+
+        self.frames       = 0                   # virtual clock (frames rendered so far)
+        self.samples      = weakref.WeakKeyDictionary()   # sound samples cache sound -> samples
+        self.output       = []                  # rendered blocks (int16) when no WAV file is open
+        self.wav          = None
+
+        if wav_ is not None:
+            self.wav = wave.open(wav_, 'wb')
+            self.wav.setnchannels(self.channels_num)
+            self.wav.setsampwidth(2)
+            self.wav.setframerate(self.frequency)
+
+    def get_init(self):
+        """ RETURN THE MIXER FORMAT (FREQUENCY, SIZE, CHANNELS) """
+        return self.frequency, self.size, self.channels_num
+
+    def create_channel(self, id_: int):
+        return OfflineChannel(self, id_)
+
+    def get_time(self):
+        """ RETURN THE VIRTUAL CLOCK IN SECONDS """
+        return self.frames / self.frequency
+
+    def ms_to_frames(self, ms_):
+        """ CONVERT A DURATION IN MILLISECONDS INTO A NUMBER OF FRAMES """
+        return max(int(ms_ * self.frequency // 1000), 1)
+
+    def gain(self, volume_: float, left_: float, right_: float):
+        """
+        RETURN THE GAIN APPLIED TO EACH OUTPUT CHANNEL (PANNING IS DISREGARDED IN MONO)
+
+        :param volume_: float; channel volume x sound volume
+        :param left_  : float; left panning
+        :param right_ : float; right panning
+        :return       : numpy.ndarray; float32 gain for each output channel
+        """
+        gain = numpy.full(self.channels_num, volume_, dtype=numpy.float32)
+        if self.channels_num > 1:
+            gain[0] *= left_
+            gain[1] *= right_
+        return gain
+
+    def get_samples(self, sound_):
+        """
+        RETURN THE SOUND SAMPLES NORMALISED IN RANGE [-1.0 ... 1.0] (FLOAT32, FRAMES x CHANNELS).
+        THE SAMPLES ARE EXTRACTED ONCE PER SOUND OBJECT AND CACHED UNTIL THE SOUND IS DELETED
+
+        :param sound_: pygame.mixer.Sound; sound
+        :return      : numpy.ndarray
+        """
+        data = self.samples.get(sound_)
+        if data is None:
+            data = self.samples[sound_] = sound_to_array(sound_)
+        return data
+
+    def mix(self, frames_: int):
+        """
+        MIX THE NEXT frames_ FRAMES OF ALL CHANNELS AND MOVE THE VIRTUAL CLOCK FORWARD
+
+        :param frames_: integer; number of frames to render
+        :return       : numpy.ndarray; float32 buffer (frames x channels)
+        """
+        out = numpy.zeros((frames_, self.channels_num), dtype=numpy.float32)
+        for channel in self.channels.values():
+            if channel.sound is not None:
+                channel.mix(out, frames_)
+        self.frames += frames_
+        return out
+
+    def advance(self, seconds_: float):
+        """
+        RENDER THE NEXT seconds_ OF AUDIO INTO THE OUTPUT (WAV FILE OR MEMORY)
+
+        :param seconds_: float; duration to render in seconds
+        :return        : None
+        """
+        frames = int(round((self.frames / self.frequency + seconds_) * self.frequency)) - self.frames
+        if frames <= 0:
+            return
+        block = numpy.clip(self.mix(frames) * 32767.0, -32768.0, 32767.0).astype(numpy.int16)
+        if self.wav is not None:
+            self.wav.writeframes(block.tobytes())
+        else:
+            self.output.append(block)
+
+    def get_array(self):
+        """ RETURN THE RENDERING KEPT IN MEMORY (INT16 ARRAY, FRAMES x CHANNELS) """
+        if not self.output:
+            return numpy.zeros((0, self.channels_num), dtype=numpy.int16)
+        return numpy.concatenate(self.output)
+
+    def write_wav(self, file_: str):
+        """
+        WRITE THE RENDERING KEPT IN MEMORY INTO A WAV FILE (16 BIT PCM)
+
+        :param file_: string; WAV file name
+        """
+        wav = wave.open(file_, 'wb')
+        try:
+            wav.setnchannels(self.channels_num)
+            wav.setsampwidth(2)
+            wav.setframerate(self.frequency)
+            wav.writeframes(self.get_array().tobytes())
+        finally:
+            wav.close()
+
+    def close(self):
+        """ CLOSE THE WAV FILE OPENED AT THE CONSTRUCTION """
+        if self.wav is not None:
+            self.wav.close()
+            self.wav = None
@@ -6,19 +6,35 @@ __version__ = "1.0.1"
 
 try:
     import pygame
-    from pygame import mixer
 except ImportError:
     raise ImportError("\n<pygame> library is missing on your system."
           "\nTry: \n   C:\\pip install pygame on a window command prompt.")
 
 
-from time import time
+from time import time, perf_counter
+from bisect import bisect_left, insort
+from heapq import heappush, heappop
+from math import log10, sqrt
+
+from SoundBackend import PygameBackend, NullSound
+
+# SoundStream, SoundAnalysis, SoundVariant and SoundEffect (numpy) are not imported by the controller,
+# a stream is recognised by its attribute streaming = True
+
+
+# LOUDNESS OF A SILENT SOUND IN LUFS (SAME VALUE THAN SoundAnalysis.SILENCE)
+SILENCE = -70.0
+
+
+# DELAY (SECONDS) BEFORE CHECKING AGAIN A SOUND STILL PLAYING AFTER ITS EXPECTED END (MIXER LATENCY, PAUSE)
+DEADLINE_RETRY = 0.1
 
 
 class SoundObject:
 
     def __init__(self, sound_, priority_: int, name_: str,
-                 channel_: int, obj_id_: int, position_: int, loop_: int = False):
+                 channel_: int, obj_id_: int, position_: int, loop_: int = False, time_: float = None,
+                 tags_: tuple = (), volume_: float = 1.0):
         """
         CREATE A SOUND OBJECT CONTAINING CERTAIN ATTRIBUTES (SEE THE
         COMPLETE LIST BELOW)
@@ -32,11 +48,14 @@ class SoundObject:
         :param position_: integer | None ; Sound position for panning sound in stereo.
                           position must be within range [0...Max display width]
         :param loop_    : int; -1 for looping the sound
+        :param time_    : float | None; Timestamp in seconds (default is the wall clock time())
+        :param tags_    : tuple; Sound tags (e.g entity id, category, material) used for bulk queries
+        :param volume_  : float; Channel volume (panning excluded) used to estimate the audible level
         """
         self.sound          = sound_                                 # sound object to play
         self.length         = sound_.get_length()                    # return the length of this sound in seconds
         self.priority       = priority_ if 0 < priority_ < 2 else 0  # sound priority - lowest to highest (0 - 2)
-        self.time           = time()                                 # timestamp
+        self.time           = time() if time_ is None else time_     # timestamp
         self.name           = name_                                  # sound name for identification
         self.active_channel = channel_                               # channel used
         self.obj_id         = obj_id_                                # unique sound id number
@@ -47,15 +66,24 @@ class SoundObject:
 
         self.pos            = position_                              # Sound position for panning method
         self.loop           = loop_
+        self.tags           = tags_                                  # sound tags (see SoundControl.get_tagged_channels)
+        self.batch          = 0                                      # last batch operation applied (see SoundControl.update)
+        self.volume         = volume_                                # channel volume (panning excluded)
 
 
 class SoundControl(object):
 
-    def __init__(self, screen_size_, channels_: int = 8):
+    def __init__(self, screen_size_, channels_: int = 8, mixer_=None):
         """
 
         :param screen_size_: pygame.Rect; Size of the active display
         :param channels_   : integer; number of channels to reserved for the sound controller
+        :param mixer_      : Mixer backend used for the playback (see SoundBackend.py), default is PygameBackend
+                             (pygame.mixer). SoundBackend.NullBackend tracks the sound durations without any audio
+                             device (headless servers), SoundRender.OfflineMixer renders offline. Any object exposing
+                             the same methods (get_init, get_num_channels, set_num_channels, set_reserved and Channel)
+                             can be used instead, e.g the pygame.mixer module itself.
+                             An optional method get_time replaces the wall clock time() for the sound timestamps
         :return            : None
         """
 
@@ -66,37 +94,163 @@ class SoundControl(object):
 
         assert channels_ >= 1, "\nArgument channel_num_ must be >=1"
 
-        if pygame.mixer.get_init() is None:
+        if mixer_ is None:
+            mixer_ = PygameBackend()
+
+        if mixer_.get_init() is None:
             raise ValueError("\nMixer has not been initialized."
                              "\nUse pygame.mixer.init() before starting the Sound controller")
 
+        self.mixer       = mixer_                               # mixer in charge of the playback
+        self.clock       = getattr(mixer_, "get_time", time)    # clock used for the sound timestamps
         self.channel_num = channels_                            # channel to init
-        self.start       = mixer.get_num_channels()             # get the total number of playback channels
+        self.start       = mixer_.get_num_channels()            # get the total number of playback channels
         self.end         = self.channel_num + self.start        # last channel
-        mixer.set_num_channels(self.end)                        # sets the number of available channels for the mixer.
-        mixer.set_reserved(self.end)                            # reserve channels from being automatically used
-        self.channels    = [mixer.Channel(j + self.start)
+        mixer_.set_num_channels(self.end)                       # sets the number of available channels for the mixer.
+        mixer_.set_reserved(self.end)                           # reserve channels from being automatically used
+        self.channels    = [mixer_.Channel(j + self.start)
                             for j in range(self.channel_num)]   # create a channel object for controlling playback
         self.snd_obj     = [None] * self.channel_num            # list of un-initialised objects
         self.channel = self.start                               # pointer to the bottom of the stack
         self.all = list(range(self.start, self.end))            # create a list with all channel number
         self.screen_size = screen_size_                         # size of the display (used for stereo mode)
-
-    def update(self):
+        self.tag_index   = {}                                   # inverted index tag -> set of channel indexes
+        self.tag_keys    = []                                   # sorted tags (prefix queries)
+        self.analyzer    = None                                 # loudness analyzer (see set_analyzer)
+        self.variant_cache = None                               # sound variants (see set_variant_cache)
+        self.effect_cache  = None                               # prerendered effects (see set_effect_cache)
+        self.cursor      = 0                                    # persistent cursor of the budgeted sweep (see update)
+        self.deadlines   = []                                   # heap (end time, id, channel index, sound object)
+        self.streams     = set()                                # channel indexes playing a SoundStream
+        self.batch_ops   = []                                   # deferred batch operations (update_volume, panning)
+        self.batch_base  = 0                                    # generation of the first operation in batch_ops
+        self.batch_lap   = 0                                    # generation at the start of the current sweep lap
+
+    def update(self, budget_us: int = None):
         """
         THIS METHOD HAS TO BE CALLED FROM THE MAIN LOOP OF YOUR PROGRAM
         DETECT SOUNDS THAT HAVE STOPPED TO PLAY ON THE MIXER AND SET THE CHANNEL VALUE TO NONE
+
+        WITHOUT BUDGET EVERY CHANNEL IS CHECKED. WITH A BUDGET (LARGE CHANNEL POOLS) THE WORK IS SPREAD
+        OVER SEVERAL FRAMES :
+        1) STREAMS ARE FED (ALWAYS DONE, A STREAM RUNS OUT OF DATA OTHERWISE)
+        2) SOUNDS THAT REACHED THEIR EXPECTED END TIME ARE CHECKED FIRST
+        3) THE OTHER CHANNELS ARE CHECKED FROM A PERSISTENT CURSOR UNTIL THE BUDGET IS SPENT (AT LEAST
+           ONE CHANNEL PER CALL), THE SWEEP ALSO APPLIES THE DEFERRED BATCH OPERATIONS
+           (SEE update_volume AND update_sounds_panning)
+        STOPS AND NEW PLAYS DO NOT DEPEND ON UPDATE (SLOTS ARE RELEASED OR SET IMMEDIATELY)
+
+        :param budget_us: integer | None; time budget in microseconds, None check every channel
+        :return         : None
         """
-        i = 0
         snd_obj = self.snd_obj
+        update_channel = self._update_channel
+
+        if budget_us is not None:
+            limit = perf_counter() + budget_us * 1e-6
+            # STREAMS HAVE TO BE FED EVERY FRAME
+            for l in list(self.streams):
+                update_channel(l)
+
+        # SOUNDS THAT REACHED THEIR END TIME
+        deadlines = self.deadlines
+        now = self.clock()
+        while deadlines and deadlines[0][0] <= now:
+            if budget_us is not None and perf_counter() >= limit:
+                break
+            entry = heappop(deadlines)
+            l, obj = entry[2], entry[3]
+            if snd_obj[l] is obj:
+                update_channel(l)
+                if snd_obj[l] is obj:
+                    # STILL PLAYING (MIXER LATENCY, PAUSE), CHECK AGAIN LATER
+                    heappush(deadlines, (now + DEADLINE_RETRY, entry[1], l, obj))
+
+        if budget_us is None:
+            if self.batch_ops:
+                self._flush_batch()
+            for l in range(self.channel_num):
+                update_channel(l)
+            return
+
+        # INCREMENTAL SWEEP (AT LEAST ONE CHANNEL PER CALL)
+        n = self.channel_num
+        cursor = self.cursor
+        for _ in range(n):
+            update_channel(cursor)
+            cursor += 1
+            if cursor == n:
+                cursor = 0
+                # OPERATIONS OLDER THAN THE LAP HAVE BEEN APPLIED TO EVERY CHANNEL
+                del self.batch_ops[:self.batch_lap - self.batch_base]
+                self.batch_base = self.batch_lap
+                self.batch_lap  = self.batch_base + len(self.batch_ops)
+            if perf_counter() >= limit:
+                break
+        self.cursor = cursor
+
+    def _update_channel(self, l: int) -> None:
+        """
+        CHECK A CHANNEL (INDEX IN THE RESERVED CHANNEL LIST), APPLY THE DEFERRED BATCH OPERATIONS,
+        FEED A STREAM AND RELEASE THE SLOT WHEN THE SOUND HAS FINISHED
 
-        for c in self.channels:
-            if c:
-                # Returns True if the mixer is busy mixing any channels.
-                # If the mixer is idle then this return False.
-                if not c.get_busy():
-                    snd_obj[i] = None
-            i += 1
+        :param l: integer; channel index
+        :return : None
+        """
+        obj = self.snd_obj[l]
+        if obj is None:
+            return
+        if obj.batch != self.batch_base + len(self.batch_ops):
+            self._apply_batch(l, obj)
+        # A STREAM IS ACTIVE UNTIL ALL ITS CHUNKS HAVE BEEN HANDED TO THE CHANNEL
+        if getattr(obj.sound, "streaming", False) and obj.sound.update():
+            return
+        # Returns True if the mixer is busy mixing any channels.
+        # If the mixer is idle then this return False.
+        if not self.channels[l].get_busy():
+            self._release(l)
+
+    def _apply_batch(self, l: int, obj_) -> None:
+        """
+        APPLY TO A CHANNEL THE BATCH OPERATIONS (update_volume, update_sounds_panning) NOT YET APPLIED
+
+        :param l   : integer; channel index (index in the reserved channel list)
+        :param obj_: SoundObject; sound object playing on the channel
+        :return    : None
+        """
+        ops = self.batch_ops
+        channel = self.channels[l]
+        for new_x, volume, left, right in ops[obj_.batch - self.batch_base:]:
+            # update_volume
+            if new_x is None:
+                if obj_.pos is not None:
+                    left, right = self.stereo_panning(obj_.pos, self.screen_size.w)
+                    channel.set_volume(left * volume, right * volume)
+                    obj_.volume = volume
+                elif hasattr(obj_.sound, "set_volume"):
+                    obj_.sound.set_volume(volume)
+            # update_sounds_panning
+            elif obj_.pos is not None:
+                obj_.pos = new_x
+                obj_.volume = volume
+                channel.set_volume(left, right)
+        obj_.batch = self.batch_base + len(ops)
+
+    def _flush_batch(self) -> None:
+        """
+        APPLY THE DEFERRED BATCH OPERATIONS TO EVERY CHANNEL (FULL SWEEP)
+
+        :return: None
+        """
+        generation = self.batch_base + len(self.batch_ops)
+        snd_obj = self.snd_obj
+        for l in range(self.channel_num):
+            obj = snd_obj[l]
+            if obj is not None and obj.batch != generation:
+                self._apply_batch(l, obj)
+        self.batch_ops  = []
+        self.batch_base = generation
+        self.batch_lap  = generation
 
     # SINGLE SOUND
     def update_sound_panning(self, new_x_: int, volume_: float, name_=None, id_=None) -> None:
@@ -146,7 +300,9 @@ class SoundControl(object):
                         if hasattr(obj, 'name') and hasattr(obj, 'active_channel'):
                             if obj.name == name_:
                                 c = obj.active_channel  # Channel playing the sound
+                                self._apply_batch(c, obj)
                                 obj.pos = new_x_        # update the sound position
+                                obj.volume = volume_    # update the sound volume
                                 try:
                                     channel = channels[c]
                                     if hasattr(channel, 'set_volume'):
@@ -167,7 +323,9 @@ class SoundControl(object):
                         if hasattr(obj, 'obj_id') and hasattr(obj, 'active_channel'):
                             if obj.obj_id == id_:
                                 c = obj.active_channel  # Channel playing the sound
+                                self._apply_batch(c, obj)
                                 obj.pos = new_x_        # update the sound position
+                                obj.volume = volume_    # update the sound volume
                                 try:
                                     channel = channels[c]
                                     if hasattr(channel, 'set_volume'):
@@ -184,7 +342,7 @@ class SoundControl(object):
                         return
 
     # ALL SOUNDS
-    def update_sounds_panning(self, new_x_: int, volume_: float) -> None:
+    def update_sounds_panning(self, new_x_: int, volume_: float, deferred_: bool = False) -> None:
         """
         PANNING IS THE DISTRIBUTION OF A SOUND SIGNAL INTO A NEW STEREO OR MULTI-CHANNEL SOUND FIELD
         CHANGE PANNING FOR ALL SOUNDS BEING PLAYED ON THE MIXER.
@@ -192,10 +350,12 @@ class SoundControl(object):
         THIS METHOD ITERATE OVER ALL SOUNDS BEING PLAYED BY THE MIXER AND ADJUST THE PANNING ACCORDING
         TO THE NEW POSITION new_x_ AND GIVEN VOLUME_
 
-        :param new_x_  : integer; new sound position in the display. Value must be in range [0, Max width]
-        :param volume_ : float; Sound volume (adjust all sound being played by the mixer)
-                         value must be in range [0 ... 1.0]
-        :return        : None
+        :param new_x_   : integer; new sound position in the display. Value must be in range [0, Max width]
+        :param volume_  : float; Sound volume (adjust all sound being played by the mixer)
+                          value must be in range [0 ... 1.0]
+        :param deferred_: bool; True the change is applied by the next budgeted update() calls (no full sweep),
+                          sounds played afterward are not affected. False the change is immediate
+        :return         : None
 
         """
         assert 0 <= new_x_ <= self.screen_size.w, \
@@ -207,31 +367,12 @@ class SoundControl(object):
 
         # Calculate the sound panning, left & right volume values
         left, right = self.stereo_panning(new_x_, self.screen_size.w)
-        left  *= volume_
-        right *= volume_
-
-        channels = self.channels    # Fetch all the channels from the sound controller
 
-        for obj in self.snd_obj:    # Iterate all the SoundObject
-            if obj:
-                if hasattr(obj, "pos") and obj.pos is not None:
-                    if hasattr(obj, 'active_channel'):
-                        c = obj.active_channel                # Channel playing the sound
-                        obj.pos = new_x_                      # update the sound position
-                        try:
-                            c = channels[c]
-                            if hasattr(c, "set_volume"):
-                                c.set_volume(left, right)   # set the panning for the channel
-                            else:
-                                raise AttributeError('\nObject is missing attributes set_volume')
-                        except IndexError as e:
-                            raise IndexError("\n %s " % e)
-                    else:
-                        raise AttributeError(
-                            "\nSoundObject is missing attribute(s), "
-                            "obj must be a SoundObject type got %s " % type(obj))
+        self.batch_ops.append((new_x_, volume_, left * volume_, right * volume_))
+        if not deferred_:
+            self._flush_batch()
 
-    def update_volume(self, volume_: float = 1.0) -> None:
+    def update_volume(self, volume_: float = 1.0, deferred_: bool = False) -> None:
         """
         UPDATE ALL SOUND OBJECT VOLUME TO A SPECIFIC VALUE.
         THIS HAS IMMEDIATE EFFECT AND DO NOT FADE THE SOUND
@@ -239,41 +380,18 @@ class SoundControl(object):
         AFFECT ALL SOUNDS WITH OR WITHOUT PANNING EFFECT.
         PANNING SOUND EFFECT WILL BE CONSERVED AFTER ADJUSTING THE VOLUME
 
-        :param volume_: float; volume value, default is 1.0
-        :return       : None
+        :param volume_  : float; volume value, default is 1.0
+        :param deferred_: bool; True the change is applied by the next budgeted update() calls (no full sweep),
+                          sounds played afterward are not affected. False the change is immediate
+        :return         : None
         """
         # SET THE VOLUME IN CASE OF AN INPUT ERROR
         if 0.0 >= volume_ >= 1.0:
             volume_ = 1.0
 
-        objs = self.snd_obj
-        i = 0
-        # SET THE VOLUME FOR ALL SOUNDS
-        for channel in self.channels:
-
-            try:
-                single_obj = objs[i]
-            except IndexError as e:
-                raise IndexError("\n %s " % e)
-
-            if single_obj is not None:
-
-                # WITH PANNING
-                if hasattr(single_obj, "pos") and single_obj.pos is not None:
-                    if hasattr(channel, "set_volume"):
-                        # Calculate the sound panning, left & right volume values
-                        left, right = self.stereo_panning(single_obj.pos, self.screen_size.w)
-                        left *= volume_
-                        right *= volume_
-                        channel.set_volume(left, right)
-
-                # WITHOUT PANNING
-                else:
-                    if single_obj is not None:
-                        if hasattr(single_obj.sound, "set_volume"):
-                            single_obj.sound.set_volume(volume_)
-
-            i += 1
+        self.batch_ops.append((None, volume_, 0.0, 0.0))
+        if not deferred_:
+            self._flush_batch()
 
     def pause_sound(self, name_: str = None, id_=None) -> None:
         """
@@ -424,7 +542,7 @@ class SoundControl(object):
         j = 0
         for object_ in self.snd_obj:
             if object_:
-                timeleft = round(object_.length - (time() - object_.time), 2)
+                timeleft = round(object_.length - (self.clock() - object_.time), 2)
                 # if timeleft < 0, most likely to be a sound with attribute loop enabled
                 if timeleft < 0.0:
                     timeleft = 0.0
@@ -443,7 +561,7 @@ class SoundControl(object):
         :return      : python list; List containing channels number playing similar sound object,
                        if no match is found, return an empty list
         """
-        assert isinstance(sound_, pygame.mixer.Sound), \
+        assert isinstance(sound_, (pygame.mixer.Sound, NullSound)) or getattr(sound_, "streaming", False), \
             "\nPositional argument sound_ must be a pygame.mixer.Sound type, got %s " % type(sound_)
         duplicate = []
         duplicate_append = duplicate.append
@@ -473,6 +591,203 @@ class SoundControl(object):
                     duplicate_append(obj)
         return duplicate
 
+    # TAGS
+    def _tag(self, l: int, obj_) -> None:
+        """
+        ADD A SOUND OBJECT TO THE TAG INDEX
+
+        :param l   : integer; channel index (index in the reserved channel list)
+        :param obj_: SoundObject; sound object playing on the channel
+        """
+        tag_index = self.tag_index
+        for tag in obj_.tags:
+            channels = tag_index.get(tag)
+            if channels is None:
+                channels = tag_index[tag] = set()
+                insort(self.tag_keys, tag)
+            channels.add(l)
+
+    def _untag(self, l: int, obj_) -> None:
+        """
+        REMOVE A SOUND OBJECT FROM THE TAG INDEX
+
+        :param l   : integer; channel index (index in the reserved channel list)
+        :param obj_: SoundObject; sound object playing on the channel
+        """
+        tag_index = self.tag_index
+        tag_keys = self.tag_keys
+        for tag in obj_.tags:
+            channels = tag_index.get(tag)
+            if channels is None:
+                continue
+            channels.discard(l)
+            if not channels:
+                del tag_index[tag]
+                del tag_keys[bisect_left(tag_keys, tag)]
+
+    def _release(self, l: int) -> None:
+        """
+        FREE A CHANNEL SLOT (SOUND OBJECT REMOVED FROM THE POOL AND FROM THE TAG INDEX)
+
+        :param l: integer; channel index (index in the reserved channel list)
+        """
+        obj = self.snd_obj[l]
+        if obj is not None:
+            if obj.tags:
+                self._untag(l, obj)
+            self.streams.discard(l)
+            self.snd_obj[l] = None
+
+    def get_tagged_channels(self, tags_, prefix_: bool = False) -> list:
+        """
+        RETURN THE CHANNELS PLAYING A SOUND WITH ALL THE GIVEN TAGS (INTERSECTION).
+        THE COST IS PROPORTIONAL TO THE NUMBER OF MATCHES (INVERTED INDEX), NOT TO THE POOL SIZE
+
+        :param tags_  : string | integer | list; tag or list of tags e.g ["entity:12", "category:footstep"],
+                        integers are converted to strings (see play)
+        :param prefix_: bool; True each tag is a prefix e.g "entity:" match "entity:12", "entity:13" etc
+        :return       : list; channel indexes (index in the reserved channel list), sorted
+        """
+        if isinstance(tags_, (str, int)):
+            tags_ = (str(tags_),)
+        else:
+            tags_ = [str(tag) for tag in tags_]
+
+        matches = []
+        for tag in tags_:
+            if prefix_:
+                tag_keys = self.tag_keys
+                channels = set()
+                i = bisect_left(tag_keys, tag)
+                while i < len(tag_keys) and tag_keys[i].startswith(tag):
+                    channels |= self.tag_index[tag_keys[i]]
+                    i += 1
+            else:
+                channels = self.tag_index.get(tag)
+            if not channels:
+                return []
+            matches.append(channels)
+
+        if not matches:
+            return []
+
+        matches.sort(key=len)
+        result = set(matches[0])
+        for channels in matches[1:]:
+            result &= channels
+            if not result:
+                break
+        return sorted(result)
+
+    def stop_tags(self, tags_, prefix_: bool = False) -> None:
+        """
+        STOP ALL SOUNDS WITH THE GIVEN TAGS (REGARDLESS OF THEIR PRIORITY)
+
+        :param tags_  : string | list; tag or list of tags (see get_tagged_channels)
+        :param prefix_: bool; True each tag is a prefix
+        :return       : None
+        """
+        for l in self.get_tagged_channels(tags_, prefix_):
+            self._stop_channel(l)
+            self._release(l)
+
+    def pause_tags(self, tags_, prefix_: bool = False) -> None:
+        """
+        PAUSE ALL SOUNDS WITH THE GIVEN TAGS
+
+        :param tags_  : string | list; tag or list of tags (see get_tagged_channels)
+        :param prefix_: bool; True each tag is a prefix
+        :return       : None
+        """
+        channels = self.channels
+        for l in self.get_tagged_channels(tags_, prefix_):
+            channels[l].pause()
+
+    def unpause_tags(self, tags_, prefix_: bool = False) -> None:
+        """
+        UNPAUSE ALL SOUNDS WITH THE GIVEN TAGS
+
+        :param tags_  : string | list; tag or list of tags (see get_tagged_channels)
+        :param prefix_: bool; True each tag is a prefix
+        :return       : None
+        """
+        channels = self.channels
+        for l in self.get_tagged_channels(tags_, prefix_):
+            channels[l].unpause()
+
+    def update_tags_panning(self, new_x_: int, volume_: float, tags_, prefix_: bool = False) -> None:
+        """
+        ADJUST THE PANNING OF ALL SOUNDS WITH THE GIVEN TAGS (SOUNDS PLAYED WITH THE PANNING MODE ONLY)
+
+        :param new_x_  : integer; new sound position in the display. Value must be in range [0, Max width]
+        :param volume_ : float; Sound volume, value must be in range [0 ... 1.0]
+        :param tags_   : string | list; tag or list of tags (see get_tagged_channels)
+        :param prefix_ : bool; True each tag is a prefix
+        :return        : None
+        """
+        assert 0 <= new_x_ <= self.screen_size.w, \
+            "\nArgument new_x_ value must be in range (0, %s) got %s" % (self.screen_size.w, new_x_)
+
+        # SET THE VOLUME IN CASE OF AN INPUT ERROR
+        if 0.0 >= volume_ >= 1.0:
+            volume_ = 1.0
+
+        left, right = self.stereo_panning(new_x_, self.screen_size.w)
+        left  *= volume_
+        right *= volume_
+
+        channels = self.channels
+        snd_obj = self.snd_obj
+        for l in self.get_tagged_channels(tags_, prefix_):
+            obj = snd_obj[l]
+            self._apply_batch(l, obj)
+            if obj.pos is not None:
+                obj.pos = new_x_
+                obj.volume = volume_
+                channels[l].set_volume(left, right)
+
+    def update_tags_volume(self, volume_: float, tags_, prefix_: bool = False) -> None:
+        """
+        UPDATE THE VOLUME OF ALL SOUNDS WITH THE GIVEN TAGS (PANNING EFFECT IS CONSERVED).
+        THE VOLUME IS SET ON THE CHANNELS, OTHER CHANNELS PLAYING THE SAME SOUND ARE NOT AFFECTED
+
+        :param volume_: float; volume value in range [0.0 ... 1.0]
+        :param tags_  : string | list; tag or list of tags (see get_tagged_channels)
+        :param prefix_: bool; True each tag is a prefix
+        :return       : None
+        """
+        # SET THE VOLUME IN CASE OF AN INPUT ERROR
+        if 0.0 >= volume_ >= 1.0:
+            volume_ = 1.0
+
+        channels = self.channels
+        snd_obj = self.snd_obj
+        screen_width = self.screen_size.w
+        for l in self.get_tagged_channels(tags_, prefix_):
+            obj = snd_obj[l]
+            self._apply_batch(l, obj)
+            if obj.pos is not None:
+                left, right = self.stereo_panning(obj.pos, screen_width)
+                channels[l].set_volume(left * volume_, right * volume_)
+            else:
+                channels[l].set_volume(volume_)
+            obj.volume = volume_
+
+    def _stop_channel(self, l: int) -> None:
+        """
+        STOP THE SOUND PLAYING ON A CHANNEL (INDEX IN THE RESERVED CHANNEL LIST).
+        A STREAM PLAYING ON THE CHANNEL IS ALSO STOPPED (BACKGROUND WORKER RELEASED)
+
+        :param l: integer; channel index
+        :return : None
+        """
+        channel = self.channels[l]
+        channel.set_volume(0.0)
+        channel.stop()
+        obj = self.snd_obj[l]
+        if obj is not None and getattr(obj.sound, "streaming", False):
+            obj.sound.stop()
+
     def stop(self, stop_list_: list):
         """
         STOP ALL SOUND BEING PLAYED ON THE GIVEN LIST OF CHANNELS.
@@ -485,15 +800,13 @@ class SoundControl(object):
             "\nPositional argument stop_list must be a python list type, got %s " % type(stop_list_)
         start = self.start
         snd_obj = self.snd_obj
-        channels = self.channels
 
         for c in stop_list_:
                 l = c - start
                 if snd_obj[l]:
                     if snd_obj[l].priority == 0:
-                        channels[l].set_volume(0.0, 0.0)
-                        channels[l].stop()
-        self.update()
+                        self._stop_channel(l)
+                        self._release(l)
 
     def stop_all_except(self, exception_: list):
         """
@@ -510,16 +823,14 @@ class SoundControl(object):
 
         start = self.start
         snd_obj = self.snd_obj
-        channels = self.channels
 
         for c in self.all:
             l = c - start
             snd_object = snd_obj[l]
             if snd_object:
                 if snd_object.obj_id not in exception_:
-                    channels[l].set_volume(0.0)
-                    channels[l].stop()
-        self.update()
+                    self._stop_channel(l)
+                    self._release(l)
 
     def stop_all(self):
         """
@@ -530,15 +841,13 @@ class SoundControl(object):
 
         start = self.start
         snd_obj = self.snd_obj
-        channels = self.channels
 
         for c in self.all:
             l = c - start
             snd_object = snd_obj[l]
             if snd_object:
-                channels[l].set_volume(0.0)
-                channels[l].stop()
-        self.update()
+                self._stop_channel(l)
+                self._release(l)
 
     def stop_name(self, name_: str = ""):
         """
@@ -548,18 +857,16 @@ class SoundControl(object):
         """
         assert isinstance(name_, str),\
             "\nPositional argument name_ must be a python string type, got %s " % type(name_)
-        channels = self.channels
-        start = self.start
 
         for sound in self.snd_obj:
             if sound and sound.name == name_:
                 try:
-                    channels[sound.active_channel - start].set_volume(0.0)
-                    channels[sound.active_channel - start].stop()
+                    # active_channel is the index in the reserved channel list
+                    self._stop_channel(sound.active_channel)
+                    self._release(sound.active_channel)
                 except IndexError:
                     # IGNORE ERROR
                     ...
-        self.update()
 
     def stop_object(self, object_id: int):
         """
@@ -571,20 +878,16 @@ class SoundControl(object):
         assert isinstance(object_id, int), \
             "\nPositional argument object_id must be a python string type, got %s " % type(object_id)
 
-        channels = self.channels
-        start = self.start
-
         for sound in self.snd_obj:
             if sound and sound.obj_id == object_id:
                 try:
-                    channels[sound.active_channel - start].set_volume(0.0)
-                    channels[sound.active_channel - start].stop()
+                    # active_channel is the index in the reserved channel list
+                    self._stop_channel(sound.active_channel)
+                    self._release(sound.active_channel)
                 except IndexError:
                     # IGNORE ERROR
                     ...
 
-        self.update()
-
     def return_time_left(self, object_id) -> float:
         """
         RETURN THE TIME LEFT IN SECONDS (RETURN -1 IF SOUND IS SEAMLESS LOOPED ON THE CHANNEL,
@@ -598,7 +901,7 @@ class SoundControl(object):
         for obj in snd_obj:
             if obj:
                 if obj.obj_id == object_id:
-                    timeleft = round(snd_obj[j].length - (time() - snd_obj[j].time), 2)
+                    timeleft = round(snd_obj[j].length - (self.clock() - snd_obj[j].time), 2)
                     # if timeleft < 0, most likely to be a sound with attribute loop enabled
                     if timeleft < 0.0:
                         if obj.loop:
@@ -656,16 +959,77 @@ class SoundControl(object):
         """ RETURN ALL SOUND OBJECTS """
         return self.snd_obj
 
+    def set_analyzer(self, analyzer_) -> None:
+        """
+        SET THE LOUDNESS ANALYZER USED FOR THE AUDIBLE LEVELS AND THE NORMALIZATION (SEE SoundAnalysis.py)
+
+        :param analyzer_: LoudnessAnalyzer | None; loudness analyzer
+        :return         : None
+        """
+        self.analyzer = analyzer_
+
+    def set_variant_cache(self, cache_) -> None:
+        """
+        SET THE CACHE OF PRECOMPUTED SOUND VARIANTS USED BY play(..., variant_=...) (SEE SoundVariant.py)
+
+        :param cache_: VariantCache | None; variant cache
+        :return      : None
+        """
+        self.variant_cache = cache_
+
+    def set_effect_cache(self, cache_) -> None:
+        """
+        SET THE CACHE OF PRERENDERED EFFECTS USED BY play(..., effect_=...) (SEE SoundEffect.py)
+
+        :param cache_: EffectCache | None; effect cache
+        :return      : None
+        """
+        self.effect_cache = cache_
+
+    def get_audible_level(self, channel_: int):
+        """
+        RETURN THE ESTIMATED AUDIBLE LEVEL (LUFS) OF THE SOUND PLAYING ON A CHANNEL
+        SOUND LOUDNESS x VOLUME x PANNING (STEREO POWER), RETURN NONE IF THE CHANNEL IS FREE
+        OR PLAYING A SOUND THAT CANNOT BE ANALYZED (STREAM, NullSound)
+
+        :param channel_: integer; channel index (index in the reserved channel list)
+        :return        : float | None; estimated level in LUFS
+        """
+        if self.analyzer is None:
+            raise ValueError("\nNo loudness analyzer, use set_analyzer() first")
+
+        obj = self.snd_obj[channel_]
+        if obj is None or not isinstance(obj.sound, pygame.mixer.Sound):
+            return None
+
+        # CATCH UP THE DEFERRED BATCH OPERATIONS BEFORE READING THE VOLUME AND POSITION
+        self._apply_batch(channel_, obj)
+        gain = obj.volume * obj.sound.get_volume()
+        if obj.pos is not None:
+            left, right = self.stereo_panning(obj.pos, self.screen_size.w)
+            gain *= sqrt((left * left + right * right) * 0.5)
+        if gain <= 0.0:
+            return SILENCE
+        return max(self.analyzer.analyze(obj.sound).loudness + 20.0 * log10(gain), SILENCE)
+
+    def get_audible_levels(self) -> list:
+        """
+        RETURN THE ESTIMATED AUDIBLE LEVEL (LUFS) OF EACH CHANNEL, NONE FOR THE FREE CHANNELS
+        (SEE get_audible_level)
+        """
+        return [self.get_audible_level(l) for l in range(self.channel_num)]
+
     def play(self, sound_, loop_=0, priority_=0, volume_=1.0,
              fade_in_ms=100, fade_out_ms=100, panning_=False, name_=None,
-             x_=None, object_id_=None):
+             x_=None, object_id_=None, tags_=None, normalize_=None, variant_=None, effect_=None):
 
         """
         PLAY A SOUND OBJECT ON THE GIVEN CHANNEL
         RETURN NONE IF ALL CHANNELS ARE BUSY OR IF AN EXCEPTION IS RAISED
 
 
-        :param sound_       : pygame mixer sound
+        :param sound_       : pygame mixer sound or SoundStream (streaming voice, see SoundStream.py),
+                              sound key when playing a variant (see variant_)
         :param loop_        : loop the sound indefinitely -1 (default = 0)
         :param priority_    : Set the sound priority (low : 0, med : 1, high : 2)
         :param volume_      : Set the sound volume 0.0 to 1.0 (100% full volume)
@@ -675,6 +1039,17 @@ class SoundControl(object):
         :param name_        : String representing the sound name (if no name default is -> str(id(sound_)))
         :param x_           : Sound position for stereo mode,
         :param object_id_   : unique sound id
+        :param tags_        : string | integer | list | None; Sound tags e.g ["entity:12", "category:footstep"],
+                              integers are converted to strings e.g 12 is the tag "12"
+                              (see get_tagged_channels, stop_tags, pause_tags, update_tags_panning ...)
+        :param normalize_   : float | None; Target loudness in LUFS e.g -23.0, the volume is adjusted to bring the
+                              sound to the target loudness (capped to 1.0). Requires a loudness analyzer.
+                              Streams and NullSound cannot be analyzed and are played at volume_
+        :param variant_     : string | None; "random" or "round_robin", play a precomputed variant of the sound key
+                              sound_ (see set_variant_cache). Name and id default to the key and the base sound
+        :param effect_      : string | None; effect preset e.g "cave", "hall", "echo", "radio" (see set_effect_cache).
+                              The sound is rendered with the effect on the first use only (cached), name and id
+                              default to the dry sound
         """
 
         l            = 0
@@ -701,6 +1076,16 @@ class SoundControl(object):
             else:
                 x_ = None
 
+            # PRECOMPUTED VARIANT OF A SOUND KEY
+            if variant_ is not None:
+                if self.variant_cache is None:
+                    raise ValueError("\nNo variant cache, use set_variant_cache() before playing variants")
+                if name_ is None:
+                    name_ = str(sound_)
+                if object_id_ is None:
+                    object_id_ = id(self.variant_cache.base(sound_))
+                sound_ = self.variant_cache.get(sound_, variant_)
+
             # set a name by default id(sound_)
             if name_ is None:
                 name_ = str(id(sound_))
@@ -709,6 +1094,27 @@ class SoundControl(object):
             if object_id_ is None:
                 object_id_ = id(sound_)
 
+            # PRERENDERED EFFECT (RENDERED ON THE FIRST USE, CACHED AFTERWARD)
+            if effect_ is not None:
+                if self.effect_cache is None:
+                    raise ValueError("\nNo effect cache, use set_effect_cache() before playing effects")
+                sound_ = self.effect_cache.get(sound_, effect_)
+
+            # TAGS ARE STRINGS (SORTED INDEX), AN INTEGER TAG e.g AN ENTITY ID 12 IS THE TAG "12"
+            if tags_ is None:
+                tags_ = ()
+            elif isinstance(tags_, (str, int)):
+                tags_ = (str(tags_),)
+            else:
+                tags_ = tuple([str(tag) for tag in tags_])
+
+            # LOUDNESS NORMALISATION (ONLY A PYGAME.MIXER.SOUND CAN BE ANALYZED, STREAMS ARE PLAYED AS IS)
+            if normalize_ is not None:
+                if self.analyzer is None:
+                    raise ValueError("\nNo loudness analyzer, use set_analyzer() before normalizing sounds")
+                if isinstance(sound_, pygame.mixer.Sound):
+                    volume_ = min(volume_ * self.analyzer.gain(sound_, normalize_), 1.0)
+
             l = channel - start
             # TODO OVERFLOW CHANNELS[l]
             # CHECK IF CURRENT CHANNEL IS BUSY
@@ -722,10 +1128,32 @@ class SoundControl(object):
                 else:
                     channels[l].set_volume(volume_)
 
-                channels[l].fadeout(fade_out_ms)
-                channels[l].play(sound_, loops=loop_, maxtime=0, fade_ms=fade_in_ms)
+                # RELEASE A STREAM LEFT ON THE CHANNEL
+                previous = self.snd_obj[l]
+                if previous is not None and getattr(previous.sound, "streaming", False):
+                    previous.sound.stop()
+                self._release(l)
 
-                self.snd_obj[l] = SoundObject(sound_, priority_, name_, l, object_id_, position_ = x_, loop_ = loop_)
+                channels[l].fadeout(fade_out_ms)
+                if getattr(sound_, "streaming", False):
+                    # THE STREAM FEEDS THE CHANNEL CHUNK BY CHUNK AND HANDLES THE LOOPS
+                    sound_.play(channels[l], loops_=loop_, fade_ms_=fade_in_ms)
+                else:
+                    channels[l].play(sound_, loops=loop_, maxtime=0, fade_ms=fade_in_ms)
+
+                now = self.clock()
+                obj = SoundObject(sound_, priority_, name_, l, object_id_, position_ = x_, loop_ = loop_,
+                                  time_ = now, tags_ = tags_, volume_ = volume_)
+                # DEFERRED BATCH OPERATIONS DO NOT APPLY TO THE NEW SOUND
+                obj.batch = self.batch_base + len(self.batch_ops)
+                self.snd_obj[l] = obj
+                if tags_:
+                    self._tag(l, obj)
+                if getattr(sound_, "streaming", False):
+                    self.streams.add(l)
+                elif loop_ >= 0:
+                    # EXPECTED END OF THE SOUND (CHECKED FIRST BY THE BUDGETED UPDATE)
+                    heappush(self.deadlines, (now + sound_.get_length() * (loop_ + 1), obj.id, l, obj))
 
                 # PREPARE THE MIXER FOR THE NEXT CHANNEL
                 self.channel += 1
@@ -738,7 +1166,8 @@ class SoundControl(object):
 
             # ALL CHANNELS ARE BUSY
             else:
-                self.stop(self.get_identical_sounds(sound_))
+                # get_identical_sounds RETURNS INDEXES IN THE RESERVED LIST, stop EXPECTS CHANNEL NUMBERS
+                self.stop([c + start for c in self.get_identical_sounds(sound_)])
                 # VERY IMPORTANT, GO TO NEXT CHANNEL.
                 self.channel += 1
                 if self.channel > end - 1:
@@ -0,0 +1,242 @@
+# encoding: utf-8
+
+"""
+HEADLESS CHECKS OF THE SOUND CONTROLLER (NullBackend, NO AUDIO DEVICE AND NO DISPLAY)
+
+python -m unittest SoundServer_headless_test
+"""
+
+try:
+    import pygame
+except ImportError:
+    raise ImportError("\n<pygame> library is missing on your system."
+          "\nTry: \n   C:\\pip install pygame on a window command prompt.")
+
+import os
+import tempfile
+import unittest
+import warnings
+from random import Random
+
+from SoundServer import SoundControl
+from SoundBackend import BackendChannel, MixerBackend, VirtualBackend, PygameBackend, NullBackend, NullSound
+from SoundTrace import TraceRecorder, TraceReplay
+
+
+SCREENRECT = pygame.Rect(0, 0, 800, 1024)
+
+
+def create_control(channels_: int = 64):
+    """ RETURN A CONTROLLER DRIVEN BY A NULL BACKEND WITH A VIRTUAL CLOCK (BACKEND, CONTROLLER) """
+    backend = NullBackend(realtime_=False)
+    return backend, SoundControl(SCREENRECT, channels_, mixer_=backend)
+
+
+def channel_state(control_, sounds_: list) -> list:
+    """
+    RETURN THE STATE OF THE SOUNDS STILL PLAYING, IN PLAY ORDER
+
+    :param control_: SoundControl; controller
+    :param sounds_ : list; sounds in play order
+    :return        : list; (play index, position, volume, sound volume, channel volume, left, right)
+    """
+    state = []
+    for l, obj in enumerate(control_.snd_obj):
+        if obj is None:
+            continue
+        channel = control_.channels[l]
+        state.append((sounds_.index(obj.sound), obj.pos, round(obj.volume, 6),
+                      round(obj.sound.get_volume(), 6), round(channel.volume, 6),
+                      round(channel.left, 6), round(channel.right, 6)))
+    return sorted(state)
+
+
+class BackendTest(unittest.TestCase):
+
+    def test_interface(self):
+        for cls in (BackendChannel, MixerBackend, VirtualBackend):
+            self.assertRaises(TypeError, cls)
+        self.assertIsInstance(NullBackend().Channel(0), BackendChannel)
+        self.assertTrue(issubclass(pygame.mixer.Channel, BackendChannel))
+        self.assertIsInstance(PygameBackend(), MixerBackend)
+
+        # A BACKEND MUST IMPLEMENT THE WHOLE INTERFACE
+        class Incomplete(VirtualBackend):
+            def get_init(self):
+                return 44100, -16, 2
+        self.assertRaises(TypeError, Incomplete)
+
+
+class BatchTest(unittest.TestCase):
+
+    def run_session(self, seed_: int, deferred_: bool):
+        """ PLAY A RANDOM SESSION (SAME SEED, SAME SESSION) AND RETURN THE FINAL STATE """
+        backend, control = create_control()
+        rng = Random(seed_)
+        sounds = []
+        for frame in range(200):
+            action = rng.random()
+            if action < 0.15 and len(sounds) < 40:
+                sound = NullSound(rng.uniform(0.5, 4.0))
+                sounds.append(sound)
+                panning = rng.random() < 0.7
+                control.play(sound, 0, volume_=rng.uniform(0.1, 1.0), panning_=panning,
+                             x_=rng.randrange(SCREENRECT.w) if panning else None)
+            elif action < 0.3:
+                control.update_volume(rng.uniform(0.0, 1.0), deferred_=deferred_)
+            elif action < 0.45:
+                control.update_sounds_panning(rng.randrange(SCREENRECT.w), rng.uniform(0.0, 1.0),
+                                              deferred_=deferred_)
+            backend.advance(1.0 / 60.0)
+            control.update(budget_us=rng.choice((0, 20, 200)))
+        control.update()
+        return channel_state(control, sounds)
+
+    def test_deferred_same_state(self):
+        for seed in range(20):
+            immediate = self.run_session(seed, False)
+            self.assertTrue(immediate)
+            self.assertEqual(immediate, self.run_session(seed, True), "seed %s" % seed)
+
+
+class TagTest(unittest.TestCase):
+
+    TAGS = ("entity:1", "entity:2", "entity:12", "category:step", "category:gun", "material:wood")
+
+    def check_index(self, control_):
+        """ THE TAG INDEX MUST ONLY REFERENCE THE CHANNELS PLAYING A TAGGED SOUND """
+        expected = {}
+        for l, obj in enumerate(control_.snd_obj):
+            if obj is not None:
+                for tag in obj.tags:
+                    expected.setdefault(tag, set()).add(l)
+        self.assertEqual(control_.tag_index, expected)
+        self.assertEqual(control_.tag_keys, sorted(expected))
+
+    def test_index_cleanup(self):
+        for seed in range(10):
+            backend, control = create_control(16)
+            rng = Random(seed)
+            sounds = []
+            for frame in range(300):
+                action = rng.random()
+                if action < 0.4:
+                    sound = NullSound(rng.uniform(0.2, 2.0))
+                    sounds.append(sound)
+                    control.play(sound, 0, name_=rng.choice(("STEP", "GUN", "")),
+                                 tags_=rng.sample(self.TAGS, rng.randrange(4)))
+                elif action < 0.5:
+                    control.stop_tags(rng.choice(("entity:", "category:")), prefix_=True)
+                elif action < 0.55:
+                    control.stop_tags(rng.choice(self.TAGS))
+                elif action < 0.6:
+                    control.stop_name(rng.choice(("STEP", "GUN")))
+                elif action < 0.65 and sounds:
+                    control.stop_object(id(rng.choice(sounds)))
+                elif action < 0.7:
+                    control.stop([c + control.start for c in range(0, control.channel_num, 3)])
+                backend.advance(1.0 / 30.0)
+                control.update(budget_us=rng.choice((None, 0, 50)))
+                self.check_index(control)
+
+            control.stop_all()
+            self.assertEqual(control.tag_index, {})
+            self.assertEqual(control.tag_keys, [])
+
+    def test_integer_tags(self):
+        backend, control = create_control(8)
+        control.play(NullSound(2.0), 0, tags_=[12, "category:x"])
+        control.play(NullSound(2.0), 0, tags_=7)
+        self.check_index(control)
+        self.assertEqual(control.tag_keys, ["12", "7", "category:x"])
+        self.assertEqual(control.get_tagged_channels(12), control.get_tagged_channels("12"))
+        self.assertEqual(len(control.get_tagged_channels([12, "category:x"])), 1)
+        control.stop_tags(12)
+        control.stop_tags([7])
+        self.check_index(control)
+        self.assertEqual(control.tag_keys, [])
+
+
+class TraceTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.file = tempfile.mkstemp(suffix=".trace")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.file)
+
+    def test_round_trip(self):
+        sounds = {"step": NullSound(1.5, "step.ogg"), "music": NullSound(30.0, "music.ogg")}
+        step, music = sounds["step"], sounds["music"]
+
+        backend, control = create_control(8)
+        recorder = TraceRecorder(control, self.file, sounds)
+        # THE RECORDER EXPOSES THE CONTROLLER ATTRIBUTES
+        self.assertEqual(recorder.start, control.start)
+        self.assertIs(recorder.snd_obj, control.snd_obj)
+
+        recorder.play(step, 0, volume_=0.5, panning_=True, x_=100, tags_=["entity:1", "category:step"])
+        backend.advance(0.25)
+        recorder.play(music, -1, name_="MUSIC")
+        recorder.update_volume(0.3)
+        backend.advance(0.5)
+        recorder.update_sound_panning(200, 0.8, None, id(step))
+        recorder.pause_sound(name_="MUSIC")
+        backend.advance(0.25)
+        recorder.update()
+        recorder.close()
+
+        # SOUNDS ARE LOADED AGAIN AT REPLAY TIME (NEW OBJECTS, SAME KEYS)
+        loaded = {"step": NullSound(1.5, "step.ogg"), "music": NullSound(30.0, "music.ogg")}
+        replay = TraceReplay(self.file, loaded)
+        self.assertEqual((replay.width, replay.height, replay.channel_num), (SCREENRECT.w, SCREENRECT.h, 8))
+        self.assertEqual([call[1] for call in replay.calls],
+                         ["play", "play", "update_volume", "update_sound_panning", "pause_sound", "update"])
+        self.assertEqual(replay.calls[0][2], (loaded["step"], 0))
+        self.assertEqual(replay.calls[0][3]["tags_"], ["entity:1", "category:step"])
+        self.assertEqual(replay.calls[3][2], (200, 0.8, None, id(loaded["step"])))
+        self.assertEqual([call[0] for call in replay.calls], [0.0, 0.25, 0.25, 0.75, 0.75, 1.0])
+        # KEYWORD NAMES ARE WRITTEN ONCE (name_ IS USED BY play AND pause_sound)
+        self.assertEqual(replay.keywords, ["volume_", "panning_", "x_", "tags_", "name_"])
+        with open(self.file, 'rb') as f:
+            self.assertEqual(f.read().count(b"name_"), 1)
+
+        replay_backend = NullBackend(realtime_=False)
+        replay_control = replay.create_control(replay_backend)
+        replay.run(replay_control, realtime_=False, advance_=replay_backend.advance)
+        state = channel_state(control, [step, music])
+        self.assertEqual([entry[0] for entry in state], [0, 1])
+        self.assertEqual(channel_state(replay_control, [loaded["step"], loaded["music"]]), state)
+        self.assertEqual(replay_control.get_tagged_channels("entity:", True),
+                         control.get_tagged_channels("entity:", True))
+
+    def test_not_recordable(self):
+        step = NullSound(1.5, "step.ogg")
+        backend, control = create_control(8)
+        recorder = TraceRecorder(control, self.file, {"step": step})
+
+        # CONFIGURATION METHODS ARE FORWARDED WITHOUT BEING RECORDED
+        analyzer = object()
+        recorder.set_analyzer(analyzer)
+        recorder.set_variant_cache(None)
+        self.assertIs(control.analyzer, analyzer)
+
+        # UNREGISTERED SOUND (GENERATED KEY) AND ARGUMENT THAT CANNOT BE ENCODED
+        other = NullSound(2.0, "other.ogg")
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            recorder.play(other, 0)
+            recorder.play(step, 0, tags_=[object()])
+        self.assertEqual(len(caught), 2)
+        self.assertEqual(sum(obj is not None for obj in control.snd_obj), 2)
+        recorder.close()
+
+        loaded = {"step": NullSound(1.5), "unregistered:1": NullSound(2.0)}
+        replay = TraceReplay(self.file, loaded)
+        self.assertEqual(replay.keys, ["step", "unregistered:1"])
+        self.assertEqual([(call[1], call[2]) for call in replay.calls], [("play", (loaded["unregistered:1"], 0))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,338 @@
+# encoding: utf-8
+
+"""
+OFFLINE CHECKS OF THE NUMPY MODULES (ANALYSIS, RENDERING, STREAMS ...), PYGAME MIXER WITH THE
+SDL DUMMY AUDIO DRIVER (NO AUDIO DEVICE AND NO DISPLAY)
+
+python -m unittest SoundServer_offline_test
+"""
+
+try:
+    import pygame
+    from pygame import sndarray
+except ImportError:
+    raise ImportError("\n<pygame> library is missing on your system."
+          "\nTry: \n   C:\\pip install pygame on a window command prompt.")
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("\n<numpy> library is missing on your system."
+          "\nTry: \n   C:\\pip install numpy on a window command prompt.")
+
+import io
+import os
+import wave
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from SoundServer import SoundControl
+from SoundBackend import NullBackend, NullSound
+from SoundRender import OfflineMixer
+from SoundStream import SoundStream
+from SoundAnalysis import LoudnessAnalyzer, measure
+from SoundVariant import VariantCache
+import SoundEffect
+from SoundEffect import EffectCache, Echo, Reverb
+
+
+SCREENRECT = pygame.Rect(0, 0, 800, 1024)
+FREQUENCY  = 44100
+
+
+def setUpModule():
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.mixer.init(FREQUENCY, -16, 2)
+
+
+def tearDownModule():
+    pygame.mixer.quit()
+
+
+def make_sound(data_):
+    """ RETURN A PYGAME SOUND FROM FLOAT SAMPLES IN RANGE [-1.0 ... 1.0] (FRAMES x 2) """
+    return sndarray.make_sound(numpy.round(numpy.asarray(data_) * 32767.0).astype(numpy.int16))
+
+
+def sine(frequency_: float, level_db_: float, seconds_: float, rate_: int = FREQUENCY):
+    """ RETURN A STEREO SINE (SAME SIGNAL ON BOTH CHANNELS), PEAK LEVEL IN DBFS """
+    t = numpy.arange(int(seconds_ * rate_)) / float(rate_)
+    wave_ = 10.0 ** (level_db_ / 20.0) * numpy.sin(2.0 * numpy.pi * frequency_ * t)
+    return numpy.repeat(wave_[:, None], 2, axis=1).astype(numpy.float32)
+
+
+def make_wav(data_):
+    """ RETURN A 16 BIT PCM WAV FILE OBJECT FROM FLOAT SAMPLES IN RANGE [-1.0 ... 1.0] (FRAMES x 2) """
+    buffer = io.BytesIO()
+    wav = wave.open(buffer, 'wb')
+    wav.setnchannels(2)
+    wav.setsampwidth(2)
+    wav.setframerate(FREQUENCY)
+    wav.writeframes(numpy.round(numpy.asarray(data_) * 32767.0).astype('<i2').tobytes())
+    wav.close()
+    buffer.seek(0)
+    return buffer
+
+
+class NormalizeTest(unittest.TestCase):
+
+    def test_sounds_not_analyzed(self):
+        analyzer = LoudnessAnalyzer()
+
+        # NullSound
+        control = SoundControl(SCREENRECT, 4, mixer_=NullBackend(realtime_=False))
+        control.set_analyzer(analyzer)
+        control.play(NullSound(1.0), 0, volume_=0.5, normalize_=-23.0)
+        self.assertEqual(control.snd_obj[0].volume, 0.5)
+        self.assertIsNone(control.get_audible_level(0))
+
+        # SoundStream
+        mixer = OfflineMixer()
+        control = SoundControl(SCREENRECT, 4, mixer_=mixer)
+        control.set_analyzer(analyzer)
+        stream = SoundStream(make_wav(numpy.zeros((FREQUENCY, 2))), chunk_ms_=250)
+        control.play(stream, 0, volume_=0.5, normalize_=-23.0)
+        self.assertEqual(control.snd_obj[0].volume, 0.5)
+        self.assertIsNone(control.get_audible_level(0))
+        control.stop_all()
+
+        # A PYGAME SOUND IS STILL NORMALIZED
+        control.play(make_sound(sine(997.0, -6.0, 1.0)), 0, volume_=1.0, normalize_=-23.0)
+        obj = [obj for obj in control.snd_obj if obj is not None][0]
+        self.assertLess(obj.volume, 1.0)
+        self.assertAlmostEqual(control.get_audible_level(obj.active_channel), -23.0, delta=0.1)
+
+
+class AnalyzerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_reference_sine(self):
+        # BS.1770: A 997 HZ SINE AT -20 DBFS ON BOTH CHANNELS READS -20 LUFS
+        for rate in (44100, 48000):
+            loudness = measure(sine(997.0, -20.0, 3.0, rate), rate)
+            self.assertAlmostEqual(loudness.loudness, -20.0, delta=0.05)
+            self.assertAlmostEqual(loudness.peak, 0.1, delta=1e-4)
+        self.assertAlmostEqual(LoudnessAnalyzer().analyze(make_sound(sine(997.0, -20.0, 3.0))).loudness,
+                               -20.0, delta=0.05)
+
+    def test_sidecar_cache(self):
+        file = os.path.join(self.directory, "loudness.json")
+        first = LoudnessAnalyzer(file).analyze(make_sound(sine(997.0, -20.0, 1.0)))
+        self.assertTrue(os.path.isfile(file))
+
+        # SAME CONTENT, NEW SOUND OBJECT AND NEW ANALYZER, THE RESULT COMES FROM THE SIDECAR FILE
+        with mock.patch("SoundAnalysis.measure", side_effect=AssertionError("measure called")):
+            second = LoudnessAnalyzer(file).analyze(make_sound(sine(997.0, -20.0, 1.0)))
+        self.assertEqual(second, first)
+
+
+class OfflineMixerTest(unittest.TestCase):
+
+    LEVEL = 0.5
+
+    def render(self, frames_: int, **kwargs):
+        """ PLAY A CONSTANT SIGNAL (LEVEL) OF frames_ FRAMES AND RENDER ONE SECOND, RETURN THE OUTPUT """
+        mixer = OfflineMixer()
+        control = SoundControl(SCREENRECT, 4, mixer_=mixer)
+        sound = make_sound(numpy.full((frames_, 2), self.LEVEL))
+        kwargs.setdefault("fade_in_ms", 0)
+        control.play(sound, **kwargs)
+        mixer.advance(1.0)
+        return mixer.get_array() / 32767.0, sound.get_volume()
+
+    def test_panning_gain(self):
+        output, volume = self.render(FREQUENCY, loop_=0, volume_=0.8, panning_=True, x_=200)
+        # x_ = 200 ON A 800 PIXELS DISPLAY, LEFT 0.75 RIGHT 0.25
+        numpy.testing.assert_allclose(output[100], [self.LEVEL * 0.8 * 0.75 * volume, self.LEVEL * 0.8 * 0.25 * volume],
+                                      atol=1e-4)
+        output, volume = self.render(FREQUENCY, loop_=0, volume_=0.8)
+        numpy.testing.assert_allclose(output[100], [self.LEVEL * 0.8 * volume] * 2, atol=1e-4)
+
+    def test_fade_in(self):
+        output, volume = self.render(FREQUENCY, loop_=0, fade_in_ms=100)
+        fade = FREQUENCY // 10
+        expected = self.LEVEL * volume * numpy.arange(fade) / float(fade)
+        numpy.testing.assert_allclose(output[:fade, 0], expected, atol=1e-4)
+        numpy.testing.assert_allclose(output[fade:, 0], self.LEVEL * volume, atol=1e-4)
+
+    def test_loops(self):
+        length = FREQUENCY // 10
+        output, volume = self.render(length, loop_=2)
+        # (LOOPS + 1) x LENGTH FRAMES, NO GAP
+        self.assertTrue(numpy.all(output[:3 * length] > 0.0))
+        self.assertTrue(numpy.all(output[3 * length:] == 0.0))
+
+    def test_pause(self):
+        mixer = OfflineMixer()
+        control = SoundControl(SCREENRECT, 4, mixer_=mixer)
+        length = FREQUENCY // 5
+        control.play(make_sound(numpy.full((length, 2), self.LEVEL)), 0, fade_in_ms=0)
+        mixer.advance(0.1)
+        control.pause_sounds()
+        mixer.advance(0.5)
+        control.unpause_sounds()
+        mixer.advance(0.5)
+        output = mixer.get_array()[:, 0]
+        pause, resume = FREQUENCY // 10, FREQUENCY * 6 // 10
+        self.assertTrue(numpy.all(output[:pause] > 0))
+        self.assertTrue(numpy.all(output[pause:resume] == 0))
+        # THE PLAYBACK RESUMES WHERE IT WAS PAUSED
+        self.assertTrue(numpy.all(output[resume:resume + length - pause] > 0))
+        self.assertTrue(numpy.all(output[resume + length - pause:] == 0))
+
+
+class StreamTest(unittest.TestCase):
+
+    def test_loops_without_gap(self):
+        # 0.25 S TRACK, 100 MS CHUNKS (THE LAST CHUNK IS SHORTER)
+        length = FREQUENCY // 4
+        stream = SoundStream(make_wav(numpy.full((length, 2), 0.5)), chunk_ms_=100, read_ahead_=2)
+        mixer = OfflineMixer()
+        control = SoundControl(SCREENRECT, 4, mixer_=mixer)
+        control.play(stream, 2, fade_in_ms=0)
+        for frame in range(90):
+            control.update()
+            mixer.advance(1.0 / 60.0)
+        output = mixer.get_array()[:, 0]
+        self.assertTrue(numpy.all(output[:3 * length] > 0))
+        self.assertTrue(numpy.all(output[3 * length:] == 0))
+        self.assertTrue(stream.eof)
+        self.assertIsNone(stream.worker)
+        self.assertTrue(all(obj is None for obj in control.snd_obj))
+
+    def test_stop_joins_worker(self):
+        mixer = OfflineMixer()
+        control = SoundControl(SCREENRECT, 4, mixer_=mixer)
+        stream = SoundStream(make_wav(numpy.full((FREQUENCY, 2), 0.5)), chunk_ms_=100, read_ahead_=2)
+        stops = (lambda: control.stop_name("MUSIC"), lambda: control.stop_object(id(stream)),
+                 lambda: control.stop_tags("music"), control.stop_all)
+        for stop in stops:
+            control.play(stream, -1, fade_in_ms=0, name_="MUSIC", tags_="music")
+            for frame in range(10):
+                control.update()
+                mixer.advance(1.0 / 60.0)
+            self.assertTrue(stream.worker.is_alive())
+            worker = stream.worker
+            stop()
+            self.assertIsNone(stream.worker)
+            self.assertFalse(worker.is_alive())
+            self.assertTrue(all(obj is None for obj in control.snd_obj))
+        stream.close()
+
+
+class VariantTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        noise = numpy.random.default_rng(1).uniform(-0.5, 0.5, (FREQUENCY // 5, 2))
+        self.sound = make_sound(noise)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def register(self, cache_, **kwargs):
+        """ REGISTER THE TEST SOUND AND RETURN THE RAW SAMPLES OF ITS VARIANTS """
+        variants = cache_.register("noise", self.sound, count_=4, pitch_=(-2.0, 2.0), gain_=(-6.0, 0.0),
+                                   cutoff_=(3000.0, 9000.0), **kwargs)
+        return [variant.get_raw() for variant in variants]
+
+    def test_seeded_determinism(self):
+        raw = self.register(VariantCache())
+        self.assertEqual(len(set(raw)), 4)
+        # SEED DERIVED FROM THE SOUND CONTENT, MEMORY OR DISK CACHE
+        self.assertEqual(self.register(VariantCache()), raw)
+        self.assertEqual(self.register(VariantCache(cache_dir_=self.directory)), raw)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertEqual(self.register(VariantCache(cache_dir_=self.directory)), raw)
+        # EXPLICIT SEED
+        self.assertEqual(self.register(VariantCache(), seed_=7), self.register(VariantCache(), seed_=7))
+        self.assertNotEqual(self.register(VariantCache(), seed_=7), raw)
+
+    def test_budget(self):
+        size = sum(len(raw) for raw in self.register(VariantCache()))
+        cache = VariantCache(budget_mb_=1.5 * size / (1024 * 1024))
+        self.register(cache)
+        with self.assertRaises(ValueError):
+            cache.register("other", self.sound, count_=4)
+        self.assertEqual(list(cache.sets), ["noise"])
+        self.assertNotIn("other", cache.specs)
+        self.assertEqual(cache.size, size)
+
+    def test_selection(self):
+        cache = VariantCache()
+        variants = cache.register("noise", self.sound, count_=4)
+        order = [variants.index(cache.get("noise", "round_robin")) for _ in range(9)]
+        self.assertEqual(order, [0, 1, 2, 3, 0, 1, 2, 3, 0])
+
+        picks = [variants.index(cache.get("noise", "random")) for _ in range(500)]
+        self.assertTrue(all(a != b for a, b in zip(picks, picks[1:])))
+        self.assertEqual(set(picks), {0, 1, 2, 3})
+
+        self.assertRaises(ValueError, cache.get, "noise", "shuffle")
+        self.assertRaises(KeyError, cache.get, "unknown")
+
+
+class EffectTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = numpy.random.default_rng(2)
+        # 0.1 S SOUNDS, A "radio" RENDER HAS THE SAME SIZE THAN THE SOUND
+        self.sounds = [make_sound(rng.uniform(-0.5, 0.5, (FREQUENCY // 10, 2))) for _ in range(3)]
+        self.size = len(self.sounds[0].get_raw())
+
+    def test_hits_and_misses(self):
+        cache = EffectCache()
+        first = cache.get(self.sounds[0], "radio")
+        self.assertIs(cache.get(self.sounds[0], "radio"), first)
+        cache.get(self.sounds[1], "radio")
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertEqual(cache.size, 2 * self.size)
+        self.assertRaises(ValueError, cache.get, self.sounds[0], "unknown")
+
+    def test_impulse_built_once(self):
+        cache = EffectCache()
+        with mock.patch("SoundEffect.impulse_response", wraps=SoundEffect.impulse_response) as build:
+            for sound in self.sounds:
+                cache.get(sound, "room")
+            cache.get(self.sounds[0], "hall")
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(sorted(cache.impulses), [("hall", FREQUENCY, 2), ("room", FREQUENCY, 2)])
+
+    def test_lru_eviction(self):
+        cache = EffectCache(budget_mb_=2.5 * self.size / (1024 * 1024))
+        a, b, c = self.sounds
+        cache.get(a, "radio")
+        cache.get(b, "radio")
+        cache.get(a, "radio")       # a IS NOW THE MOST RECENTLY USED
+        cache.get(c, "radio")       # b IS EVICTED
+        self.assertEqual(list(cache.cache), [(a, "radio"), (c, "radio")])
+        self.assertLessEqual(cache.size, cache.budget)
+
+    def test_add_preset(self):
+        cache = EffectCache()
+        cache.add_preset("slap", Echo(0.05, 0.2, 0.5))
+        old = cache.get(self.sounds[0], "slap")
+        cache.get(self.sounds[0], "radio")
+        cache.add_preset("slap", Echo(0.01, 0.2, 0.5))
+        self.assertEqual(list(cache.cache), [(self.sounds[0], "radio")])
+        self.assertEqual(cache.size, self.size)
+        new = cache.get(self.sounds[0], "slap")
+        self.assertNotEqual(new.get_length(), old.get_length())
+        self.assertEqual(cache.misses, 3)
+
+        # A NEW REVERB PRESET ALSO DISCARDS ITS IMPULSE RESPONSE
+        room = cache.get(self.sounds[0], "room")
+        cache.add_preset("room", Reverb(0.1, 0.005, 8000.0, 0.25))
+        self.assertNotIn(("room", FREQUENCY, 2), cache.impulses)
+        self.assertLess(cache.get(self.sounds[0], "room").get_length(), room.get_length())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,289 @@
+# encoding: utf-8
+
+"""
+STREAMING VOICE FOR THE SOUND CONTROLLER
+
+A SoundStream plays a long track (music, ambient) without decoding the whole file in memory.
+The file is decoded in fixed size chunks by a background worker, the chunks are converted into
+the mixer format (pygame.sndarray) and fed to the channel with Channel.queue().
+The worker reads ahead a bounded number of chunks (read_ahead_), the memory used by a stream is
+therefore about (read_ahead_ + 2) x chunk_ms_ of PCM data whatever the length of the track.
+
+The stream is played like any other sound with SoundControl.play (one SoundStream per voice),
+panning, volume, pause and stop methods work the same way.
+
+e.g
+    MUSIC = SoundStream("music.wav", chunk_ms_=500, read_ahead_=4)
+    SND.play(MUSIC, -1, volume_=0.8, name_="MUSIC")
+    ...
+    SND.update()   # feed the channel, called every frame from the main loop
+
+Files are decoded with the python wave module (PCM WAV, 8, 16, 24 or 32 bit). pygame cannot decode
+compressed formats incrementally, any decoder object exposing the wave.Wave_read methods
+(getnchannels, getsampwidth, getframerate, getnframes, readframes, rewind) can be passed instead of
+a file name.
+"""
+
+try:
+    import pygame
+    from pygame import mixer
+except ImportError:
+    raise ImportError("\n<pygame> library is missing on your system."
+          "\nTry: \n   C:\\pip install pygame on a window command prompt.")
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("\n<numpy> library is missing on your system."
+          "\nTry: \n   C:\\pip install numpy on a window command prompt.")
+
+import wave
+import queue
+import threading
+
+from SoundRender import array_to_sound
+
+
+# END OF STREAM MARKER (PUT IN THE CHUNK QUEUE BY THE WORKER)
+_END = object()
+
+
+class SoundStream:
+
+    # RECOGNISED AS A STREAMING VOICE BY SoundControl (NO IMPORT OF THIS MODULE IN THE CONTROLLER)
+    streaming = True
+
+    def __init__(self, file_, chunk_ms_: int = 500, read_ahead_: int = 4):
+        """
+        CREATE A STREAMING VOICE
+
+        :param file_      : string | file object | decoder; PCM WAV file (name or file object) or an object
+                            exposing the wave.Wave_read methods
+        :param chunk_ms_  : integer; chunk duration in milliseconds
+        :param read_ahead_: integer; maximum number of chunks decoded ahead of the playback
+        """
+        assert chunk_ms_ > 0, "\nArgument chunk_ms_ must be > 0"
+        assert read_ahead_ >= 1, "\nArgument read_ahead_ must be >= 1"
+
+        if mixer.get_init() is None:
+            raise ValueError("\nMixer has not been initialized."
+                             "\nUse pygame.mixer.init() before creating a sound stream")
+
+        self.reader = file_ if hasattr(file_, "readframes") else wave.open(file_, 'rb')
+
+        self.frequency, self.size, self.channels_num = mixer.get_init()
+        self.src_frequency = self.reader.getframerate()
+        self.src_channels  = self.reader.getnchannels()
+        self.src_width     = self.reader.getsampwidth()
+        self.src_frames    = self.reader.getnframes()
+
+        assert self.src_width in (1, 2, 3, 4), \
+            "\nUnsupported sample width, got %s bytes" % self.src_width
+
+        self.chunk_frames = max(self.src_frequency * chunk_ms_ // 1000, 1)   # chunk size (source frames)
+        self.read_ahead   = read_ahead_
+        self.volume       = 1.0
+        self.channel      = None             # channel playing the stream
+        self.chunks       = None             # decoded chunks waiting to be queued
+        self.worker       = None             # background decoder
+        self.halt         = threading.Event()
+        self.eof          = True             # all chunks have been handed to the channel
+        self.blocking     = False            # wait for the worker (channel driven by a virtual clock)
+        self.error        = None             # exception raised by the worker
+
+    def get_length(self):
+        """ RETURN THE LENGTH OF THE TRACK IN SECONDS (SINGLE PLAY) """
+        return self.src_frames / float(self.src_frequency)
+
+    def get_volume(self):
+        """ RETURN THE STREAM VOLUME """
+        return self.volume
+
+    def set_volume(self, value_: float):
+        """
+        SET THE STREAM VOLUME (APPLIED TO THE CHUNK BEING PLAYED AND TO THE NEXT CHUNKS)
+
+        :param value_: float; volume in range [0.0 ... 1.0]
+        """
+        self.volume = value_
+        channel = self.channel
+        if channel is not None:
+            for sound in (channel.get_sound(), channel.get_queue()):
+                if sound is not None:
+                    sound.set_volume(value_)
+
+    def play(self, channel_, loops_: int = 0, fade_ms_: int = 0):
+        """
+        START THE STREAM ON A GIVEN CHANNEL. THE FIRST CHUNK IS DECODED IMMEDIATELY, THE REST OF THE
+        TRACK IS DECODED BY THE BACKGROUND WORKER
+
+        :param channel_: pygame.mixer.Channel; channel reserved for the stream
+        :param loops_  : integer; number of repeat after the first play, -1 loop indefinitely
+        :param fade_ms_: integer; fade in duration in milliseconds
+        """
+        self.stop()
+
+        self.reader.rewind()
+        self.halt.clear()
+        self.chunks  = queue.Queue(maxsize=self.read_ahead)
+        self.eof     = False
+        self.error   = None
+        self.channel = channel_
+        # OFFLINE RENDERING IS DETERMINISTIC, THE STREAM WAITS FOR THE WORKER INSTEAD OF STARVING
+        self.blocking = not getattr(channel_, "realtime", True)
+
+        chunk = self.read_chunk()
+        if chunk is None:
+            self.eof = True
+            return
+
+        chunk.set_volume(self.volume)
+        channel_.play(chunk, loops=0, maxtime=0, fade_ms=fade_ms_)
+
+        self.worker = threading.Thread(target=self.decode, args=(loops_,), daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        """ STOP THE BACKGROUND WORKER AND RELEASE THE CHANNEL (THE CHANNEL IS NOT STOPPED) """
+        self.halt.set()
+        worker = self.worker
+        if worker is not None:
+            # UNBLOCK THE WORKER WAITING FOR A FREE SLOT
+            self.drain()
+            worker.join()
+            self.worker = None
+        self.drain()
+        self.channel = None
+        self.eof     = True
+
+    def drain(self):
+        """ REMOVE ALL THE CHUNKS WAITING IN THE QUEUE """
+        chunks = self.chunks
+        if chunks is None:
+            return
+        while True:
+            try:
+                chunks.get_nowait()
+            except queue.Empty:
+                break
+
+    def update(self):
+        """
+        FEED THE CHANNEL WITH THE NEXT DECODED CHUNK, THIS METHOD IS CALLED BY SoundControl.update.
+        A CHUNK IS QUEUED WHEN THE CHANNEL QUEUE IS EMPTY. ON A REAL TIME CHANNEL THE CALL NEVER WAITS
+        FOR THE WORKER (NO CHUNK READY, RETRY AT THE NEXT FRAME), A CHANNEL THAT HAS RUN OUT OF DATA
+        IS RESTARTED WITH THE NEXT CHUNK ON A LATER FRAME. THE CALL WAITS ONLY WITH AN OFFLINE MIXER
+        (VIRTUAL CLOCK, THE RENDERING MUST NOT DEPEND ON THE DECODING SPEED)
+
+        :return: bool; True while the stream has chunks left to hand to the channel
+        """
+        channel = self.channel
+        if channel is None or self.eof:
+            return False
+
+        busy = channel.get_busy()
+        if busy and channel.get_queue() is not None:
+            return True
+
+        try:
+            chunk = self.chunks.get(block=self.blocking)
+        except queue.Empty:
+            # WORKER BEHIND (DISK OR DECODER STALL), TRY AGAIN AT THE NEXT FRAME
+            return True
+
+        if chunk is _END:
+            self.eof    = True
+            self.worker = None
+            if self.error is not None:
+                raise self.error
+            return False
+
+        chunk.set_volume(self.volume)
+        if busy:
+            channel.queue(chunk)
+        else:
+            channel.play(chunk)
+        return True
+
+    def decode(self, loops_: int):
+        """
+        BACKGROUND WORKER, DECODE THE TRACK CHUNK BY CHUNK (BLOCK WHEN read_ahead_ CHUNKS ARE WAITING)
+
+        :param loops_: integer; number of repeat after the first play, -1 loop indefinitely
+        """
+        try:
+            while not self.halt.is_set():
+                chunk = self.read_chunk()
+                if chunk is None:
+                    if loops_ == 0 or self.src_frames == 0:
+                        break
+                    if loops_ > 0:
+                        loops_ -= 1
+                    self.reader.rewind()
+                    continue
+                self.put(chunk)
+        except Exception as e:
+            self.error = e
+        self.put(_END)
+
+    def put(self, item_):
+        """ PUT AN ITEM IN THE CHUNK QUEUE, GIVE UP WHEN THE STREAM IS STOPPED """
+        while not self.halt.is_set():
+            try:
+                self.chunks.put(item_, timeout=0.05)
+                return
+            except queue.Full:
+                continue
+
+    def read_chunk(self):
+        """
+        DECODE THE NEXT CHUNK AND CONVERT IT INTO A PYGAME SOUND (MIXER FORMAT)
+
+        :return: pygame.mixer.Sound | None; None at the end of the file
+        """
+        raw = self.reader.readframes(self.chunk_frames)
+        if not raw:
+            return None
+
+        width = self.src_width
+
+        # PCM TO FLOAT32 IN RANGE [-1.0 ... 1.0]
+        if width == 1:
+            data = (numpy.frombuffer(raw, dtype=numpy.uint8).astype(numpy.float32) - 128.0) / 128.0
+        elif width == 2:
+            data = numpy.frombuffer(raw, dtype='<i2').astype(numpy.float32) / 32768.0
+        elif width == 3:
+            b = numpy.frombuffer(raw, dtype=numpy.uint8).reshape(-1, 3).astype(numpy.int32)
+            data = (((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8) >> 8).astype(numpy.float32) / 8388608.0
+        else:
+            data = numpy.frombuffer(raw, dtype='<i4').astype(numpy.float32) / 2147483648.0
+
+        data = data.reshape(-1, self.src_channels)
+
+        # CHANNELS CONVERSION
+        channels_num = self.channels_num
+        if self.src_channels != channels_num:
+            if self.src_channels == 1:
+                data = numpy.repeat(data, channels_num, axis=1)
+            elif channels_num == 1:
+                data = data.mean(axis=1, keepdims=True)
+            elif self.src_channels > channels_num:
+                data = data[:, :channels_num]
+            else:
+                data = numpy.concatenate(
+                    (data, numpy.repeat(data[:, -1:], channels_num - self.src_channels, axis=1)), axis=1)
+
+        # SAMPLE RATE CONVERSION (LINEAR INTERPOLATION)
+        if self.src_frequency != self.frequency:
+            n = data.shape[0]
+            count = max(int(round(n * self.frequency / float(self.src_frequency))), 1)
+            positions = numpy.arange(count, dtype=numpy.float32) * (self.src_frequency / float(self.frequency))
+            frames = numpy.arange(n, dtype=numpy.float32)
+            data = numpy.stack([numpy.interp(positions, frames, data[:, c]) for c in range(channels_num)], axis=1)
+
+        return array_to_sound(data)
+
+    def close(self):
+        """ STOP THE STREAM AND CLOSE THE DECODER """
+        self.stop()
+        self.reader.close()
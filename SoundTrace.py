@@ -0,0 +1,403 @@
+# encoding: utf-8
+
+"""
+BINARY TRACE RECORDING AND REPLAY OF SOUNDCONTROL CALLS
+
+TraceRecorder wraps a SoundControl instance (opt-in, the game uses the recorder in place of the
+controller) and logs every public method call with a timestamp and its arguments into a compact
+binary trace. Sounds (and streams) are never pickled, they are referenced by a key given at
+registration and resolved again at replay time. Integer arguments equal to id(sound) of a
+registered sound (default object_id_ value) are recorded as a reference to that sound as well.
+Method and keyword names are written once and referenced by index in the calls.
+
+Recording never stops the game: the configuration methods (set_analyzer, set_variant_cache ...) are
+forwarded without being recorded, a sound that was not registered is registered with a generated key
+("unregistered:<index>") and a call with an argument that cannot be encoded is forwarded without
+being recorded (a warning is issued in both cases).
+
+TraceReplay reads a trace and drives a SoundControl instance (pygame mixer with the dummy driver
+or an offline mixer) at the recorded speed or flat out, measuring the time spent in each method.
+
+e.g
+    SND = TraceRecorder(SoundControl(SCREENRECT, 8), "match.trace", {"ALARM": sound1})
+    SND.play(sound1, 0, volume_=1.0)
+    ...
+    SND.close()
+
+    REPLAY = TraceReplay("match.trace", {"ALARM": sound1})
+    REPLAY.run(REPLAY.create_control(), realtime_=False)
+    REPLAY.show_timings()
+
+Command line (sound keys are file names in the sound directory, SDL dummy audio driver):
+    python SoundTrace.py match.trace --sounds Assets --realtime
+"""
+
+try:
+    import pygame
+except ImportError:
+    raise ImportError("\n<pygame> library is missing on your system."
+          "\nTry: \n   C:\\pip install pygame on a window command prompt.")
+
+import numbers
+import struct
+import warnings
+from time import perf_counter, sleep
+
+
+_MAGIC   = b'SNDTRACE'
+_VERSION = 2
+_HEADER  = struct.Struct('<HiiI')       # version, screen width, screen height, channels
+
+# RECORD TYPES
+_METHOD  = 1                            # method name definition
+_SOUND   = 2                            # sound key definition
+_CALL    = 3                            # method call
+_KEYWORD = 4                            # keyword name definition
+
+_CALL_HEADER = struct.Struct('<dHBB')   # timestamp, method index, args count, kwargs count
+
+_INT     = struct.Struct('<q')
+_FLOAT   = struct.Struct('<d')
+_INDEX   = struct.Struct('<H')
+_LENGTH  = struct.Struct('<I')
+_RECT    = struct.Struct('<iiii')
+
+
+class TraceRecorder:
+
+    def __init__(self, control_, file_: str, sounds_: dict = None):
+        """
+        RECORD ALL THE PUBLIC METHOD CALLS OF A SOUNDCONTROL INSTANCE INTO A BINARY TRACE.
+        USE THE RECORDER IN PLACE OF THE CONTROLLER, ATTRIBUTES AND RETURN VALUES ARE UNCHANGED
+
+        :param control_: SoundControl; controller to record
+        :param file_   : string; trace file name
+        :param sounds_ : dict | None; sounds to reference in the trace {key: pygame.mixer.Sound | SoundStream}
+        """
+        # RECORDER STATE USES PRIVATE NAMES, PUBLIC NAMES ARE THE CONTROLLER ATTRIBUTES (see __getattr__)
+        object.__setattr__(self, '_control', control_)
+        self._clock    = control_.clock
+        self._start    = self._clock()
+        self._methods  = {}                  # method name -> index
+        self._keywords = {}                  # keyword name -> index
+        self._sounds   = {}                  # id(sound) -> (index, sound)
+        self._file     = open(file_, 'wb')
+
+        rect = control_.screen_size
+        self._file.write(_MAGIC + _HEADER.pack(_VERSION, rect.w, rect.h, control_.channel_num))
+
+        if sounds_ is not None:
+            for key, sound in sounds_.items():
+                self.register(key, sound)
+
+    def register(self, key_: str, sound_):
+        """
+        REFERENCE A SOUND IN THE TRACE WITH A GIVEN KEY (THE SAME KEY IS USED TO FIND THE SOUND AT
+        REPLAY TIME, e.g THE SOUND FILE NAME)
+
+        :param key_  : string; sound key
+        :param sound_: pygame.mixer.Sound | SoundStream; sound object
+        """
+        if id(sound_) in self._sounds:
+            return
+        index = len(self._sounds)
+        self._sounds[id(sound_)] = (index, sound_)
+        self._file.write(bytes((_SOUND,)) + _INDEX.pack(index) + _encode_str(key_))
+
+    def __getattr__(self, name_):
+        # CALLED FOR EVERY NAME BUT register, close AND THE PRIVATE STATE (CONTROLLER ATTRIBUTES & METHODS)
+        attribute = getattr(self._control, name_)
+        # CONFIGURATION METHODS (ANALYZER, CACHES) TAKE OBJECTS THAT CANNOT BE RECORDED
+        if name_.startswith('_') or name_.startswith('set_') or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            try:
+                self._record(name_, args, kwargs)
+            except ValueError as error:
+                warnings.warn("\nCall %s not recorded%s" % (name_, error))
+            return attribute(*args, **kwargs)
+
+        return call
+
+    def __setattr__(self, name_, value_):
+        # PUBLIC ATTRIBUTES ARE SET ON THE CONTROLLER
+        if name_.startswith('_'):
+            object.__setattr__(self, name_, value_)
+        else:
+            setattr(self._control, name_, value_)
+
+    def _record(self, name_: str, args_: tuple, kwargs_: dict):
+        """
+        WRITE A METHOD CALL INTO THE TRACE
+
+        :param name_  : string; method name
+        :param args_  : tuple; positional arguments
+        :param kwargs_: dict; keyword arguments
+        """
+        index = self._methods.get(name_)
+        write = self._file.write
+        if index is None:
+            index = self._methods[name_] = len(self._methods)
+            write(bytes((_METHOD,)) + _INDEX.pack(index) + _encode_str(name_))
+
+        data = [bytes((_CALL,)),
+                _CALL_HEADER.pack(self._clock() - self._start, index, len(args_), len(kwargs_))]
+        for value in args_:
+            self._encode(value, data)
+        keywords = self._keywords
+        for key, value in kwargs_.items():
+            keyword = keywords.get(key)
+            if keyword is None:
+                keyword = keywords[key] = len(keywords)
+                write(bytes((_KEYWORD,)) + _INDEX.pack(keyword) + _encode_str(key))
+            data.append(_INDEX.pack(keyword))
+            self._encode(value, data)
+        write(b''.join(data))
+
+    def _encode(self, value_, data_: list):
+        """
+        ENCODE AN ARGUMENT (NONE, BOOL, INT, FLOAT, STRING, LIST, TUPLE, PYGAME.RECT OR A REGISTERED SOUND)
+
+        :param value_: argument
+        :param data_ : list; bytes buffer
+        """
+        append = data_.append
+        if value_ is None:
+            append(b'N')
+        elif value_ is True or value_ is False:
+            append(b'T' if value_ else b'F')
+        elif isinstance(value_, numbers.Integral):
+            entry = self._sounds.get(value_)
+            if entry is not None:
+                # id(sound) of a registered sound
+                append(b'I' + _INDEX.pack(entry[0]))
+            else:
+                append(b'i' + _INT.pack(value_))
+        elif isinstance(value_, numbers.Real):
+            append(b'f' + _FLOAT.pack(value_))
+        elif isinstance(value_, str):
+            append(b's' + _encode_str(value_))
+        elif isinstance(value_, (list, tuple)):
+            append((b'l' if isinstance(value_, list) else b't') + _LENGTH.pack(len(value_)))
+            for item in value_:
+                self._encode(item, data_)
+        elif isinstance(value_, pygame.Rect):
+            append(b'R' + _RECT.pack(value_.x, value_.y, value_.w, value_.h))
+        else:
+            entry = self._sounds.get(id(value_))
+            if entry is None or entry[1] is not value_:
+                if not hasattr(value_, "get_length"):
+                    raise ValueError("\nCannot record argument %s" % type(value_))
+                # SOUND NOT REGISTERED, THE REPLAY NEEDS A SOUND WITH THE GENERATED KEY
+                key = "unregistered:%s" % len(self._sounds)
+                warnings.warn("\nSound %s recorded with the key %s, use TraceRecorder.register"
+                              " to give it a key" % (repr(value_), key))
+                self.register(key, value_)
+                entry = self._sounds[id(value_)]
+            append(b'S' + _INDEX.pack(entry[0]))
+
+    def close(self):
+        """ CLOSE THE TRACE FILE """
+        self._file.close()
+
+
+class TraceReplay:
+
+    def __init__(self, file_: str, sounds_: dict):
+        """
+        LOAD A BINARY TRACE RECORDED WITH TraceRecorder
+
+        :param file_  : string; trace file name
+        :param sounds_: dict; sounds referenced by the trace {key: pygame.mixer.Sound | SoundStream}
+        """
+        with open(file_, 'rb') as f:
+            data = f.read()
+
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("\nFile %s is not a sound trace" % file_)
+
+        offset = len(_MAGIC)
+        version, self.width, self.height, self.channel_num = _HEADER.unpack_from(data, offset)
+        if version != _VERSION:
+            raise ValueError("\nUnsupported trace version, got %s " % version)
+        offset += _HEADER.size
+
+        self.sounds   = sounds_
+        self.keys     = []                  # sound index -> key
+        self.names    = []                  # method index -> name
+        self.keywords = []                  # keyword index -> name
+        self.calls    = []                  # (timestamp, method name, args, kwargs)
+        self.timings  = {}                  # method name -> [calls, seconds]
+        self.data     = data
+
+        # NAME DEFINITION RECORDS
+        tables = {_METHOD: self.names, _SOUND: self.keys, _KEYWORD: self.keywords}
+
+        size = len(data)
+        while offset < size:
+            kind = data[offset]
+            offset += 1
+            if kind in tables:
+                offset += _INDEX.size
+                text, offset = _decode_str(data, offset)
+                tables[kind].append(text)
+            elif kind == _CALL:
+                timestamp, index, nargs, nkwargs = _CALL_HEADER.unpack_from(data, offset)
+                offset += _CALL_HEADER.size
+                args = []
+                for i in range(nargs):
+                    value, offset = self.decode(offset)
+                    args.append(value)
+                kwargs = {}
+                for i in range(nkwargs):
+                    key = self.keywords[_INDEX.unpack_from(data, offset)[0]]
+                    kwargs[key], offset = self.decode(offset + _INDEX.size)
+                self.calls.append((timestamp, self.names[index], tuple(args), kwargs))
+            else:
+                raise ValueError("\nCorrupted trace, unknown record type %s at offset %s" % (kind, offset - 1))
+
+        self.data = None
+
+    def sound(self, index_: int):
+        """ RETURN THE SOUND REFERENCED BY A SOUND INDEX """
+        key = self.keys[index_]
+        try:
+            return self.sounds[key]
+        except KeyError:
+            raise ValueError("\nSound key %s is missing from the replay sounds" % key)
+
+    def decode(self, offset_: int):
+        """
+        DECODE AN ARGUMENT
+
+        :param offset_: integer; offset in the trace data
+        :return       : tuple; (value, next offset)
+        """
+        data = self.data
+        tag = data[offset_:offset_ + 1]
+        offset_ += 1
+        if tag == b'N':
+            return None, offset_
+        if tag == b'T':
+            return True, offset_
+        if tag == b'F':
+            return False, offset_
+        if tag == b'i':
+            return _INT.unpack_from(data, offset_)[0], offset_ + _INT.size
+        if tag == b'f':
+            return _FLOAT.unpack_from(data, offset_)[0], offset_ + _FLOAT.size
+        if tag == b's':
+            return _decode_str(data, offset_)
+        if tag == b'S':
+            return self.sound(_INDEX.unpack_from(data, offset_)[0]), offset_ + _INDEX.size
+        if tag == b'I':
+            return id(self.sound(_INDEX.unpack_from(data, offset_)[0])), offset_ + _INDEX.size
+        if tag == b'l' or tag == b't':
+            count = _LENGTH.unpack_from(data, offset_)[0]
+            offset_ += _LENGTH.size
+            items = []
+            for i in range(count):
+                value, offset_ = self.decode(offset_)
+                items.append(value)
+            return (items if tag == b'l' else tuple(items)), offset_
+        if tag == b'R':
+            return pygame.Rect(*_RECT.unpack_from(data, offset_)), offset_ + _RECT.size
+        raise ValueError("\nCorrupted trace, unknown argument tag %s at offset %s" % (tag, offset_ - 1))
+
+    def create_control(self, mixer_=None):
+        """
+        CREATE A SOUNDCONTROL INSTANCE WITH THE RECORDED SETTINGS (DISPLAY SIZE AND CHANNELS)
+
+        :param mixer_: mixer used for the playback (see SoundControl), default pygame.mixer
+        :return      : SoundControl
+        """
+        from SoundServer import SoundControl
+        return SoundControl(pygame.Rect(0, 0, self.width, self.height), self.channel_num, mixer_=mixer_)
+
+    def run(self, control_, realtime_: bool = True, advance_=None):
+        """
+        REPLAY THE TRACE ON A SOUNDCONTROL INSTANCE
+
+        :param control_ : SoundControl; controller to drive
+        :param realtime_: bool; True replay at the recorded speed, False flat out
+        :param advance_ : callable | None; called with the elapsed recorded time (seconds) before each call,
+                          e.g OfflineMixer.advance to render the session while replaying
+        :return         : float; replay duration in seconds (wall clock)
+        """
+        timings = self.timings
+        last  = 0.0
+        start = perf_counter()
+
+        for timestamp, name, args, kwargs in self.calls:
+
+            if advance_ is not None and timestamp > last:
+                advance_(timestamp - last)
+            last = timestamp
+
+            if realtime_:
+                delay = timestamp - (perf_counter() - start)
+                if delay > 0:
+                    sleep(delay)
+
+            method = getattr(control_, name)
+            t = perf_counter()
+            method(*args, **kwargs)
+            t = perf_counter() - t
+
+            timing = timings.get(name)
+            if timing is None:
+                timings[name] = [1, t]
+            else:
+                timing[0] += 1
+                timing[1] += t
+
+        return perf_counter() - start
+
+    def show_timings(self):
+        """
+        DISPLAY THE NUMBER OF CALLS AND THE TIME SPENT IN EACH METHOD DURING THE LAST REPLAYS
+        """
+        for name, (count, total) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            print('%-24s calls %8s total(ms) %10.3f mean(us) %8.3f' %
+                  (name, count, total * 1e3, total * 1e6 / count))
+
+
+def _encode_str(text_: str):
+    """ ENCODE A STRING (LENGTH + UTF-8) """
+    raw = text_.encode('utf-8')
+    return _LENGTH.pack(len(raw)) + raw
+
+
+def _decode_str(data_: bytes, offset_: int):
+    """ DECODE A STRING, RETURN THE STRING AND THE NEXT OFFSET """
+    length = _LENGTH.unpack_from(data_, offset_)[0]
+    offset_ += _LENGTH.size
+    return data_[offset_:offset_ + length].decode('utf-8'), offset_ + length
+
+
+if __name__ == "__main__":
+
+    import os
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a SoundControl binary trace")
+    parser.add_argument("trace", help="trace file")
+    parser.add_argument("--sounds", default=".", help="directory containing the sounds (keys are file names)")
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded speed")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.mixer.init()
+
+    class SoundDirectory(dict):
+        """ LOAD THE SOUNDS ON DEMAND FROM THE SOUND DIRECTORY """
+        def __missing__(self, key_):
+            sound = self[key_] = pygame.mixer.Sound(os.path.join(args.sounds, key_))
+            return sound
+
+    REPLAY = TraceReplay(args.trace, SoundDirectory())
+    DURATION = REPLAY.run(REPLAY.create_control(), realtime_=args.realtime)
+    print("%s calls replayed in %.3f s (recorded %.3f s)" %
+          (len(REPLAY.calls), DURATION, REPLAY.calls[-1][0] if REPLAY.calls else 0.0))
+    REPLAY.show_timings()
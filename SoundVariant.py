@@ -0,0 +1,256 @@
+# encoding: utf-8
+
+"""
+PRECOMPUTED SOUND VARIANTS
+
+pygame.mixer cannot change the pitch or filter a sound while playing it, the same sample played
+over and over sounds mechanical ("machine-gun effect"). VariantCache builds from a base sound a set
+of variants (pitch/rate resampling, gain jitter, low-pass filter) once, with vectorized numpy code
+over the samples returned by pygame.sndarray. The sound controller picks a variant at play time
+(random or round robin) without any DSP cost.
+
+Variants are built when the sound is registered, never at play time. The memory budget is checked
+at registration (ValueError when the variants do not fit), a set released with evict() is replaced
+by the base sound until variants() rebuilds it. Variants can be cached on disk (numpy .npz files
+keyed by the sound content hash and the variant parameters). The random parameters are seeded from
+the same hash, a given sound always produces the same variants.
+
+e.g
+    VARIANTS = VariantCache(budget_mb_=32.0, cache_dir_="variants")
+    VARIANTS.register("footstep", pygame.mixer.Sound("footstep.ogg"), count_=8,
+                      pitch_=(-1.0, 1.0), gain_=(-3.0, 0.0), cutoff_=(4000.0, 12000.0))
+    SND.set_variant_cache(VARIANTS)
+    SND.play("footstep", 0, variant_="random")
+"""
+
+try:
+    import pygame
+    from pygame import mixer, sndarray
+except ImportError:
+    raise ImportError("\n<pygame> library is missing on your system."
+          "\nTry: \n   C:\\pip install pygame on a window command prompt.")
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("\n<numpy> library is missing on your system."
+          "\nTry: \n   C:\\pip install numpy on a window command prompt.")
+
+import os
+import hashlib
+from random import randrange
+
+from SoundRender import sound_to_array, array_to_mixer
+
+
+def resample(data_, rate_: float):
+    """
+    CHANGE THE PLAYBACK RATE OF A SAMPLE ARRAY (LINEAR INTERPOLATION, ALL CHANNELS AT ONCE).
+    A RATE ABOVE 1.0 RAISES THE PITCH AND SHORTENS THE SOUND
+
+    :param data_: numpy.ndarray; float32 samples (frames x channels)
+    :param rate_: float; playback rate e.g 2.0 ** (semitones / 12.0)
+    :return     : numpy.ndarray; resampled float32 samples
+    """
+    frames = data_.shape[0]
+    if rate_ == 1.0 or frames < 2:
+        return data_
+    count = max(int(frames / rate_), 1)
+    positions = numpy.arange(count, dtype=numpy.float64) * rate_
+    index = numpy.minimum(positions.astype(numpy.int64), frames - 2)
+    fraction = (positions - index).astype(numpy.float32)[:, None]
+    return data_[index] * (1.0 - fraction) + data_[index + 1] * fraction
+
+
+def lowpass(data_, cutoff_: float, frequency_: int, taps_: int = 63):
+    """
+    LOW-PASS FILTER A SAMPLE ARRAY (WINDOWED SINC FIR APPLIED WITH AN FFT, ALL CHANNELS AT ONCE).
+    THE FILTER DELAY IS REMOVED, THE OUTPUT HAS THE SAME LENGTH THAN THE INPUT
+
+    :param data_     : numpy.ndarray; float32 samples (frames x channels)
+    :param cutoff_   : float; cutoff frequency in Hz
+    :param frequency_: integer; sample rate
+    :param taps_     : integer; filter length (odd)
+    :return          : numpy.ndarray; filtered float32 samples
+    """
+    frames = data_.shape[0]
+    if frames == 0 or cutoff_ >= frequency_ / 2.0:
+        return data_
+    fc = cutoff_ / float(frequency_)
+    n = numpy.arange(taps_) - (taps_ - 1) / 2.0
+    kernel = 2.0 * fc * numpy.sinc(2.0 * fc * n) * numpy.hamming(taps_)
+    kernel /= kernel.sum()
+    size = frames + taps_ - 1
+    spectrum = numpy.fft.rfft(data_, n=size, axis=0) * numpy.fft.rfft(kernel, n=size)[:, None]
+    delay = (taps_ - 1) // 2
+    return numpy.fft.irfft(spectrum, n=size, axis=0)[delay:delay + frames].astype(numpy.float32)
+
+
+class VariantCache:
+
+    def __init__(self, budget_mb_: float = 64.0, cache_dir_: str = None):
+        """
+        BUILD AND CACHE SOUND VARIANTS (PITCH, GAIN AND LOW-PASS VARIATIONS OF A BASE SOUND)
+
+        :param budget_mb_: float; memory budget in megabytes for the variant samples, registering a sound
+                           above the budget raises a ValueError
+        :param cache_dir_: string | None; directory caching the variants on disk, None memory only
+        """
+        if mixer.get_init() is None:
+            raise ValueError("\nMixer has not been initialized."
+                             "\nUse pygame.mixer.init() before starting the variant cache")
+
+        assert budget_mb_ > 0, "\nArgument budget_mb_ must be > 0"
+
+        self.budget    = int(budget_mb_ * 1024 * 1024)  # budget in bytes
+        self.cache_dir = cache_dir_
+        self.specs     = {}                           # key -> (base sound, count, pitch, gain, cutoff, seed)
+        self.sets      = {}                           # key -> list of variants
+        self.sizes     = {}                           # key -> size of the variant set in bytes
+        self.size      = 0                            # memory used by the variant sets in bytes
+        self.last      = {}                           # key -> index of the last variant played
+
+        if cache_dir_ is not None:
+            os.makedirs(cache_dir_, exist_ok=True)
+
+    def register(self, key_, sound_, count_: int = 8, pitch_: tuple = (-1.0, 1.0),
+                 gain_: tuple = (-2.0, 0.0), cutoff_: tuple = None, seed_: int = None):
+        """
+        DEFINE AND BUILD THE VARIANTS OF A SOUND (THE DSP RUNS HERE, NOT AT PLAY TIME)
+
+        :param key_   : hashable; sound key e.g "footstep"
+        :param sound_ : pygame.mixer.Sound; base sound
+        :param count_ : integer; number of variants
+        :param pitch_ : tuple; pitch range in semitones (min, max), (0, 0) no pitch variation
+        :param gain_  : tuple; gain range in dB (min, max), (0, 0) no gain variation
+        :param cutoff_: tuple | None; low-pass cutoff range in Hz (min, max), None no filter
+        :param seed_  : integer | None; random seed, None derive the seed from the sound content
+        :return       : list; variants (pygame.mixer.Sound)
+        """
+        assert isinstance(sound_, pygame.mixer.Sound), \
+            "\nPositional argument sound_ must be a pygame.mixer.Sound type, got %s " % type(sound_)
+        assert count_ >= 1, "\nArgument count_ must be >= 1"
+
+        self.discard(key_)
+        self.specs[key_] = (sound_, count_, tuple(pitch_), tuple(gain_),
+                            None if cutoff_ is None else tuple(cutoff_), seed_)
+        try:
+            return self.variants(key_)
+        except ValueError:
+            self.discard(key_)
+            raise
+
+    def discard(self, key_) -> None:
+        """ REMOVE A SOUND KEY AND ITS VARIANTS FROM THE CACHE (FILES ON DISK ARE KEPT) """
+        self.evict(key_)
+        self.specs.pop(key_, None)
+        self.last.pop(key_, None)
+
+    def evict(self, key_) -> None:
+        """ RELEASE THE VARIANTS OF A SOUND KEY (THE DEFINITION IS KEPT, SEE variants() TO REBUILD THEM) """
+        if self.sets.pop(key_, None) is not None:
+            self.size -= self.sizes.pop(key_)
+
+    def base(self, key_):
+        """ RETURN THE BASE SOUND OF A SOUND KEY """
+        return self.specs[key_][0]
+
+    def variants(self, key_) -> list:
+        """
+        RETURN THE VARIANTS OF A SOUND KEY (LOADED FROM DISK OR BUILT WHEN NOT IN MEMORY).
+        DO NOT CALL THIS METHOD FROM THE GAME LOOP, A SET NOT IN MEMORY IS BUILT SYNCHRONOUSLY
+
+        :param key_: hashable; sound key
+        :return    : list; variants (pygame.mixer.Sound)
+        """
+        variants = self.sets.get(key_)
+        if variants is not None:
+            return variants
+
+        if key_ not in self.specs:
+            raise KeyError("\nUnknown sound key %s, use register() first" % repr(key_))
+
+        arrays = self.build(key_)
+        variants = [sndarray.make_sound(array) for array in arrays]
+        size = sum(array.nbytes for array in arrays)
+
+        # SETS IN USE ARE NEVER EVICTED, THE BUDGET IS ENFORCED HERE (OUTSIDE THE PLAY PATH)
+        if self.size + size > self.budget:
+            raise ValueError("\nVariant budget exceeded, %s needs %s bytes, %s bytes available"
+                             % (repr(key_), size, self.budget - self.size))
+
+        self.sets[key_]  = variants
+        self.sizes[key_] = size
+        self.size       += size
+        return variants
+
+    def build(self, key_) -> list:
+        """
+        BUILD THE VARIANTS OF A SOUND KEY (OR LOAD THEM FROM THE DISK CACHE)
+
+        :param key_: hashable; sound key
+        :return    : list; variants in the mixer format (numpy arrays)
+        """
+        sound, count, pitch, gain, cutoff, seed = self.specs[key_]
+
+        digest = hashlib.sha1(sound.get_raw())
+        digest.update(repr((count, pitch, gain, cutoff, seed, mixer.get_init())).encode())
+        digest = digest.hexdigest()
+
+        path = None
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, digest + ".npz")
+            if os.path.isfile(path):
+                with numpy.load(path) as archive:
+                    return [archive['v%s' % i] for i in range(count)]
+
+        rng = numpy.random.default_rng(int(digest[:16], 16) if seed is None else seed)
+        frequency = mixer.get_init()[0]
+        data = sound_to_array(sound)
+
+        arrays = []
+        for i in range(count):
+            variant = resample(data, 2.0 ** (rng.uniform(*pitch) / 12.0))
+            if cutoff is not None:
+                variant = lowpass(variant, rng.uniform(*cutoff), frequency)
+            variant = variant * numpy.float32(10.0 ** (rng.uniform(*gain) / 20.0))
+            arrays.append(array_to_mixer(variant))
+
+        if path is not None:
+            temp = path + ".tmp.npz"
+            numpy.savez(temp, **{'v%s' % i: array for i, array in enumerate(arrays)})
+            os.replace(temp, path)
+
+        return arrays
+
+    def get(self, key_, mode_: str = "random"):
+        """
+        PICK A VARIANT OF A SOUND KEY (NO DSP, THE VARIANTS ARE PRECOMPUTED).
+        THE BASE SOUND IS RETURNED WHEN THE VARIANTS ARE NOT IN MEMORY (SEE evict)
+
+        :param key_ : hashable; sound key
+        :param mode_: string; "random" (never the same variant twice in a row) or "round_robin"
+        :return     : pygame.mixer.Sound
+        """
+        variants = self.sets.get(key_)
+        if variants is None:
+            if key_ not in self.specs:
+                raise KeyError("\nUnknown sound key %s, use register() first" % repr(key_))
+            return self.specs[key_][0]
+        count = len(variants)
+        last = self.last.get(key_, -1)
+
+        if mode_ == "round_robin":
+            index = (last + 1) % count
+        elif mode_ == "random":
+            if count == 1:
+                index = 0
+            else:
+                index = randrange(count - 1)
+                if index >= last >= 0:
+                    index += 1
+        else:
+            raise ValueError("\nArgument mode_ must be 'random' or 'round_robin', got %s " % repr(mode_))
+
+        self.last[key_] = index
+        return variants[index]